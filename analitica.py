@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from datetime import date, timedelta
+import logging
+import os
+import threading
+from time import monotonic
+
+from sqlalchemy import case, func
+
+from dinero import a_pesos
+from models import db, Producto, Ticket, LineaVenta
+from archivo import ingresos_por_hora_archivo
+from resumenes import obtener_resumen
+
+logger = logging.getLogger(__name__)
+
+TTL_ANALITICA = float(os.getenv('ANALITICA_TTL', '30'))
+CAPACIDAD_ANALITICA = int(os.getenv('ANALITICA_CAPACIDAD', '256'))
+LIMITE_MAS_VENDIDOS = 10
+LIMITE_TRANSACCIONES = 50
+DIAS_MAPA_CALOR = 30
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+
+def _cacheado(funcion):
+    """Guarda el resultado por argumentos durante TTL_ANALITICA segundos, hasta CAPACIDAD_ANALITICA entradas (LRU)"""
+    def envoltura(*args):
+        clave = (funcion.__name__,) + args
+        ahora = monotonic()
+        with _lock:
+            entrada = _cache.get(clave)
+            if entrada is not None:
+                if entrada[0] > ahora:
+                    _cache.move_to_end(clave)
+                    return entrada[1]
+                del _cache[clave]
+
+        resultado = funcion(*args)
+        with _lock:
+            _cache[clave] = (ahora + TTL_ANALITICA, resultado)
+            _cache.move_to_end(clave)
+            while len(_cache) > CAPACIDAD_ANALITICA:
+                _cache.popitem(last=False)
+        return resultado
+
+    envoltura.__name__ = funcion.__name__
+    envoltura.__doc__ = funcion.__doc__
+    return envoltura
+
+def limpiar_cache():
+    with _lock:
+        _cache.clear()
+
+def _filtrar(consulta, id_terminal):
+    if id_terminal is not None:
+        consulta = consulta.where(Ticket.id_terminal == id_terminal)
+    return consulta
+
+def _lineas_del_dia(*columnas, fecha):
+    return db.select(*columnas).select_from(LineaVenta).join(Ticket, LineaVenta.ticket_id == Ticket.id).where(Ticket.fecha == fecha)
+
+@_cacheado
+def productos_mas_vendidos(id_terminal, fecha, limite=LIMITE_MAS_VENDIDOS):
+    """Productos con más unidades vendidas en el día, agrupados por id y con el nombre actual del catálogo"""
+    # Las líneas sin producto vinculado se agrupan por el nombre con que se vendieron
+    sin_producto = case((LineaVenta.producto_id.is_(None), LineaVenta.producto_nombre))
+    vendidos = _filtrar(_lineas_del_dia(
+        LineaVenta.producto_id,
+        func.min(LineaVenta.producto_nombre).label('producto_nombre'),
+        func.sum(LineaVenta.cantidad).label('unidades'),
+        func.sum(LineaVenta.precio_centavos * LineaVenta.cantidad).label('centavos'),
+        fecha=fecha
+    ).group_by(LineaVenta.producto_id, sin_producto), id_terminal).subquery()
+
+    nombre = func.coalesce(Producto.nombre, vendidos.c.producto_nombre).label('nombre')
+    consulta = db.select(nombre, vendidos.c.unidades, vendidos.c.centavos).select_from(vendidos).outerjoin(
+        Producto, Producto.id == vendidos.c.producto_id
+    ).order_by(vendidos.c.unidades.desc(), nombre).limit(limite)
+
+    return [
+        {'producto': nombre, 'cantidad': int(cantidad), 'ingresos': a_pesos(centavos)}
+        for nombre, cantidad, centavos in db.session.execute(consulta)
+    ]
+
+@_cacheado
+def transacciones_del_dia(id_terminal, fecha, limite=LIMITE_TRANSACCIONES):
+    """Últimas líneas vendidas en el día, con las claves que usa dashboard.html"""
+    consulta = _lineas_del_dia(
+        LineaVenta.producto_nombre,
+        Ticket.id_terminal,
+        Ticket.id_cliente,
+        Ticket.hora,
+        LineaVenta.precio_centavos,
+        LineaVenta.cantidad,
+        fecha=fecha
+    ).order_by(Ticket.hora.desc(), LineaVenta.id.desc()).limit(limite)
+
+    return [
+        {
+            'Producto': f.producto_nombre,
+            'ID_Terminal': f.id_terminal,
+            'ID_Cliente': f.id_cliente,
+            'Hora': f.hora.strftime('%H:%M:%S'),
+            'Total_Venta': a_pesos(f.precio_centavos * f.cantidad),
+            'Cantidad': f.cantidad
+        }
+        for f in db.session.execute(_filtrar(consulta, id_terminal))
+    ]
+
+@_cacheado
+def mapa_calor(id_terminal, hasta, dias=DIAS_MAPA_CALOR):
+    """Ingresos por hora del día y terminal de los últimos `dias` días, tabla y archivo"""
+    desde = hasta - timedelta(days=dias - 1)
+    hora = func.extract('hour', Ticket.hora).label('hora')
+    # Basta con las cabeceras: el subtotal del ticket ya es la suma de sus líneas
+    consulta = db.select(
+        Ticket.id_terminal,
+        hora,
+        func.sum(Ticket.subtotal_centavos)
+    ).where(
+        Ticket.fecha >= desde,
+        Ticket.fecha <= hasta
+    ).group_by(Ticket.id_terminal, hora)
+
+    celdas = {}
+    for terminal, h, centavos in db.session.execute(_filtrar(consulta, id_terminal)):
+        celdas.setdefault(terminal, [0.0] * 24)[int(h)] += a_pesos(centavos)
+    for (terminal, h), ingresos in ingresos_por_hora_archivo(desde, hasta, id_terminal).items():
+        celdas.setdefault(terminal, [0.0] * 24)[int(h)] += float(ingresos)
+
+    maximo = max((v for valores in celdas.values() for v in valores), default=0.0)
+    return {
+        'dias': dias,
+        'maximo': maximo,
+        'horas': list(range(24)),
+        'filas': [
+            {
+                'terminal': terminal,
+                'valores': [round(v, 2) for v in valores],
+                'intensidades': [round(v / maximo, 3) if maximo else 0 for v in valores],
+                'total': round(sum(valores), 2)
+            }
+            for terminal, valores in sorted(celdas.items())
+        ]
+    }
+
+def estadisticas_dashboard(id_terminal=None, hoy=None):
+    """Cifras de stats_avanzadas para el dashboard, sin materializar las líneas de venta"""
+    hoy = hoy or date.today()
+    resumen = obtener_resumen(id_terminal, hoy)
+    return {
+        'resumen': resumen,
+        'ingresos_hoy': resumen['ingresos_hoy'],
+        'monto_historico': resumen['ingresos'],
+        'promedio_diario': a_pesos(round(resumen['ingresos_centavos'] / resumen['dias'])) if resumen['dias'] else 0,
+        'productos_vendidos_hoy': resumen['unidades_hoy'],
+        'transacciones_hoy_count': resumen['tickets_hoy'],
+        'transacciones_hoy': transacciones_del_dia(id_terminal, hoy),
+        'productos_mas_vendidos': productos_mas_vendidos(id_terminal, hoy),
+        'mapa_calor': mapa_calor(id_terminal, hoy)
+    }
@@ -6,14 +6,9 @@ base_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(base_dir))
 os.chdir(str(base_dir))
 
-from app import app, init_db
-from models import db
+from app import app
 
 app.config['ENV'] = 'production'
 
-with app.app_context():
-    try:
-        db.create_all()
-        init_db()
-    except Exception as e:
-        print(f"Error initializing database: {e}")
+# Sin inicialización al importar: la primera request que usa la BD verifica el
+# esquema (nada si `flask migrar` corrió en el build contra esta misma base)
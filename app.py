@@ -1,13 +1,33 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context
 from datetime import datetime, date, time
+import gzip
+import hmac
 import json
 import os
 import re
+import uuid
 from urllib.parse import unquote
 from functools import wraps
 import logging
+import threading
 
-from models import db, Producto, Venta, Contador
+import click
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Producto, Ticket, LineaVenta, ResumenVenta
+from migraciones import aplicar_migraciones, esquema_al_dia, esquema_marcado, marcar_esquema
+from despliegue import perfil_despliegue, opciones_motor
+from dinero import PORCENTAJE_IVA, a_pesos, subtotal_linea, totales_en_pesos, totales_ticket
+from resumenes import reconstruir_resumenes
+from analitica import estadisticas_dashboard
+from catalogo_cache import obtener_catalogo, invalidar_catalogo, version_catalogo
+from busqueda import indice_productos
+from carritos import crear_almacen_carritos
+from numeracion import AsignadorTickets
+from metricas import Metricas
+from ventas import claves_recientes, guardar_tickets, resumenes_guardados, sincronizar_tickets, validar_clave, MAXIMO_TICKETS_POR_LOTE
+from snapshot_catalogo import construir_snapshot, serializar, snapshot_completo, parsear_marca
+from terminales import autenticar, crear_terminal, crear_usuario, existe_terminal, invalidar_registro, obtener_registro, terminales_activas, ROLES, TERMINAL_TODAS
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,50 +41,148 @@ if not DATABASE_URL:
 else:
     DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://')
 
+PERFIL_DESPLIEGUE = perfil_despliegue()
+
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opciones_motor(PERFIL_DESPLIEGUE, DATABASE_URL)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['TEMPLATES_AUTO_RELOAD'] = True
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600
+app.config['METRICAS_SQL_LENTO_MS'] = float(os.getenv('SQL_LENTO_MS', '200'))
+app.config['METRICAS_UMBRAL_N_MAS_1'] = int(os.getenv('UMBRAL_N_MAS_1', '10'))
+# Sin token /metrics solo lo ve un admin logueado; con token también un scraper con "Authorization: Bearer <token>"
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN')
 
 db.init_app(app)
+metricas = Metricas(app)
+
+# Carritos en la BD salvo CARRITO_BACKEND=memoria, que solo sirve con un único proceso
+# (desarrollo, benchmarks): con varios workers cada request puede caer en otro carrito
+CARRITO_BACKEND = os.getenv('CARRITO_BACKEND') or 'bd'
+if CARRITO_BACKEND == 'memoria' and (PERFIL_DESPLIEGUE == 'serverless' or int(os.getenv('WEB_CONCURRENCY', '1')) > 1):
+    raise ValueError("CARRITO_BACKEND=memoria no sirve con varios workers ni en serverless: usar CARRITO_BACKEND=bd")
+carritos = crear_almacen_carritos(CARRITO_BACKEND, ttl=app.config['PERMANENT_SESSION_LIFETIME'])
+asignador_tickets = AsignadorTickets(tamano_bloque=int(os.getenv('TICKETS_POR_BLOQUE', '1')))
+
+PRODUCTOS_POR_PAGINA = 50
+PRODUCTOS_POR_PAGINA_MAX = 200
 
 CONFIG = {
-    "iva": 21.0,
+    "iva": PORCENTAJE_IVA,
     "moneda": "$",
-    "empresa": "POCOPAN",
-    "usuarios": {
-        "admin": {"password": "admin123", "rol": "admin", "terminal": "TODAS"},
-        "pos1": {"password": "pos1123", "rol": "pos", "terminal": "POS1"},
-        "pos2": {"password": "pos2123", "rol": "pos", "terminal": "POS2"},
-        "pos3": {"password": "pos3123", "rol": "pos", "terminal": "POS3"}
-    }
+    "empresa": "POCOPAN"
 }
 
+_esquema_listo = False
+_lock_inicializacion = threading.Lock()
+
+# Rutas que no tocan la BD: se sirven sin esperar la verificación del esquema
+ENDPOINTS_SIN_BD = {'static', 'index', 'logout', 'metrics'}
+
+def preparar_esquema():
+    """create_all, migraciones pendientes y resúmenes históricos si la tabla quedó vacía; devuelve las migraciones aplicadas"""
+    db.create_all()
+    aplicadas = aplicar_migraciones()
+    
+    if ResumenVenta.query.first() is None and Ticket.query.first() is not None:
+        logger.info("Reconstruyendo resúmenes de ventas...")
+        reconstruir_resumenes()
+    return aplicadas
+
 def init_db():
-    """Inicializa la base de datos con datos de ejemplo"""
+    """Crea el esquema y los datos iniciales, salvo que la marca de versión diga que ya están"""
+    global _esquema_listo
+    
     with app.app_context():
-        db.create_all()
-        
-        if Producto.query.first() is None:
-            logger.info("Creando productos de ejemplo...")
-            productos = [
-                Producto(nombre='Cajas Verdes GRANJA ANIMALES DINOS', categoria='Ingenio', subcategoria='Madera Ingenio', precio_venta=25000.0, proveedor='Proveedor A'),
-                Producto(nombre='Pezca Gusanos', categoria='Ingenio', subcategoria='Madera Ingenio', precio_venta=30800.0, proveedor='Proveedor B'),
-                Producto(nombre='Juego de Mesa Clásico', categoria='Juego Meza', subcategoria='Estrategia', precio_venta=15500.0, proveedor='Proveedor C'),
-                Producto(nombre='Rompecabezas 1000 Piezas', categoria='Puzzle', subcategoria='Educativo', precio_venta=12000.0, proveedor='Proveedor D'),
-                Producto(nombre='Muñeco Coleccionable', categoria='Figuras', subcategoria='Acción', precio_venta=8900.0, proveedor='Proveedor E'),
-            ]
-            for p in productos:
-                db.session.add(p)
-            db.session.commit()
-            logger.info(f"✅ {len(productos)} productos creados")
-        
-        for terminal in ['POS1', 'POS2', 'POS3', 'TODAS']:
-            if not Contador.query.filter_by(terminal=terminal).first():
-                contador = Contador(terminal=terminal)
-                db.session.add(contador)
+        if esquema_marcado(DATABASE_URL):
+            logger.info("✅ Esquema migrado en el build, se omite la inicialización")
+        elif esquema_al_dia():
+            logger.info("✅ Esquema al día, se omite la inicialización")
+        else:
+            preparar_esquema()
+    _esquema_listo = True
+
+@app.before_request
+def inicializar_diferido():
+    """La primera request que necesita la BD verifica el esquema, una vez por proceso"""
+    if _esquema_listo or request.endpoint in ENDPOINTS_SIN_BD:
+        return
+    with _lock_inicializacion:
+        if not _esquema_listo:
+            init_db()
+
+@app.cli.command('reconstruir-resumenes')
+def reconstruir_resumenes_command():
+    """Recalcula la tabla resumen_ventas a partir de los tickets"""
+    total = reconstruir_resumenes()
+    print(f"✅ {total} resúmenes diarios reconstruidos")
+
+@app.cli.command('archivar-ventas')
+@click.option('--dias-calientes', type=int, default=None, help='Días (incluido hoy) que quedan en la base')
+def archivar_ventas_command(dias_calientes):
+    """Mueve los días cerrados de ventas al archivo Parquet particionado por fecha y terminal"""
+    from archivo import archivar_ventas, DIAS_EN_CALIENTE
+    try:
+        resultado = archivar_ventas(dias_calientes or DIAS_EN_CALIENTE)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    print(f"🗄️ {resultado['filas']} ventas de {resultado['dias']} días archivadas")
+
+@app.cli.command('vincular-productos')
+def vincular_productos_command():
+    """Completa el producto_id de las líneas de venta cuyo nombre ya está en el catálogo"""
+    from ventas import vincular_productos
+    with db.engine.begin() as conexion:
+        vinculadas = vincular_productos(conexion)
+    print(f"🔗 {vinculadas} líneas de venta vinculadas a su producto")
+
+@app.cli.command('migrar')
+def migrar_command():
+    """Aplica las migraciones de esquema pendientes y reconstruye los resúmenes si faltan"""
+    aplicadas = preparar_esquema()
+    marcar_esquema(DATABASE_URL)
+    print(f"✅ {aplicadas} migraciones aplicadas")
+
+@app.cli.command('crear-terminal')
+@click.argument('codigo')
+@click.option('--nombre', default=None, help='Nombre para mostrar')
+@click.option('--sucursal', default=None, help='Sucursal a la que pertenece')
+def crear_terminal_command(codigo, nombre, sucursal):
+    """Da de alta una terminal con su contador de tickets"""
+    try:
+        terminal = crear_terminal(codigo, nombre, sucursal)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    invalidar_registro()
+    print(f"🖥️ Terminal {terminal.codigo} creada")
+
+@app.cli.command('crear-usuario')
+@click.argument('usuario')
+@click.option('--rol', type=click.Choice(ROLES), default='pos')
+@click.option('--terminal', default=None, help='Código de la terminal (no hace falta para admin)')
+@click.password_option()
+def crear_usuario_command(usuario, rol, terminal, password):
+    """Da de alta un usuario con la contraseña hasheada"""
+    try:
+        crear_usuario(usuario, password, rol, terminal and terminal.upper())
         db.session.commit()
-        logger.info("✅ Contadores inicializados")
+    except ValueError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    invalidar_registro()
+    print(f"👤 Usuario {usuario} creado")
+
+@app.cli.command('importar-catalogo')
+@click.argument('archivo', default='catalogo.xlsx')
+@click.option('--sin-bajas', is_flag=True, help='No desactivar productos que faltan en el archivo')
+@click.option('--simular', is_flag=True, help='Mostrar los cambios sin aplicarlos')
+def importar_catalogo_command(archivo, sin_bajas, simular):
+    """Importa un catálogo .xlsx/.csv aplicando altas, modificaciones y bajas en lote"""
+    from importar_catalogo import importar_catalogo
+    resumen = importar_catalogo(archivo, desactivar_faltantes=not sin_bajas, simular=simular)
+    print(f"{'🔍 Simulación' if simular else '✅ Catálogo importado'}: {resumen}")
 
 def login_required(f):
     @wraps(f)
@@ -100,18 +218,17 @@ def login():
         usuario = request.form.get('usuario')
         password = request.form.get('password')
         
-        if usuario in CONFIG['usuarios']:
-            user_config = CONFIG['usuarios'][usuario]
-            if user_config['password'] == password:
-                session['usuario'] = usuario
-                session['rol'] = user_config['rol']
-                session['terminal'] = user_config['terminal']
-                session.permanent = True
-                
-                if user_config['rol'] == 'admin':
-                    return redirect(url_for('dashboard'))
-                else:
-                    return redirect(url_for('punto_venta'))
+        registrado = autenticar(usuario, password)
+        if registrado:
+            session['usuario'] = registrado.usuario
+            session['rol'] = registrado.rol
+            session['terminal'] = registrado.terminal
+            session.permanent = True
+            
+            if registrado.rol == 'admin':
+                return redirect(url_for('dashboard'))
+            else:
+                return redirect(url_for('punto_venta'))
         
         return render_template('login.html', error='Usuario o contraseña incorrectos')
     
@@ -119,14 +236,36 @@ def login():
 
 @app.route('/logout')
 def logout():
+    if 'carrito_id' in session:
+        carritos.vaciar(session['carrito_id'])
     session.clear()
     return redirect(url_for('login'))
 
+def get_carrito_id():
+    if 'carrito_id' not in session:
+        session['carrito_id'] = uuid.uuid4().hex
+    return session['carrito_id']
+
 def get_carrito():
-    usuario = session.get('usuario')
-    if f'carrito_{usuario}' not in session:
-        session[f'carrito_{usuario}'] = []
-    return session[f'carrito_{usuario}']
+    return carritos.obtener(get_carrito_id())
+
+def calcular_totales(acumulados):
+    """Totales a mostrar a partir de los acumulados del carrito, sin recorrer sus líneas"""
+    return {
+        'lineas': acumulados['lineas'],
+        'unidades': acumulados['unidades'],
+        **totales_en_pesos(totales_ticket(acumulados['subtotal_centavos'], CONFIG['iva']))
+    }
+
+def respuesta_carrito(mensaje, cambio):
+    """Solo la línea modificada y los totales; el POS aplica el cambio sobre su copia del carrito"""
+    return jsonify({
+        'success': True,
+        'message': mensaje,
+        'id': cambio.id,
+        'linea': cambio.linea,
+        'totales': calcular_totales(cambio.totales)
+    })
 
 @app.route('/punto-venta')
 @login_required
@@ -135,68 +274,67 @@ def punto_venta():
     rol = session.get('rol')
     terminal = session.get('terminal')
     
-    carrito_actual = get_carrito()
+    carrito_id = get_carrito_id()
+    carrito_actual = carritos.obtener(carrito_id)
     
-    contador = Contador.query.filter_by(terminal=terminal).first()
-    id_cliente_proximo = (contador.ultimo_cliente + 1) if contador else 1
+    id_cliente_proximo = asignador_tickets.proximo_cliente(terminal)
     
-    productos = Producto.query.filter_by(estado='Disponible').all()
+    catalogo = obtener_catalogo()
     
     return render_template('pos.html',
-                         productos=productos,
+                         total_productos=len(catalogo.productos),
+                         categorias=catalogo.categorias,
                          carrito=carrito_actual,
+                         totales=calcular_totales(carritos.totales(carrito_id)),
                          usuario_actual=usuario,
                          rol_actual=rol,
                          terminal_actual=terminal,
                          id_cliente_actual=f"CLIENTE-{terminal}-{id_cliente_proximo:04d}")
 
 @app.route('/dashboard')
-@app.route('/dashboard/<terminal_id>')
+@app.route('/dashboard/<terminal_id>', endpoint='dashboard_terminal')
 @login_required
 def dashboard(terminal_id=None):
     rol = session.get('rol')
     terminal = session.get('terminal')
     
     if terminal_id is None:
-        terminal_id = terminal if rol != 'admin' else 'TODAS'
+        terminal_id = terminal if rol != 'admin' else TERMINAL_TODAS
     
     if rol == 'pos' and terminal_id != terminal:
         return redirect(url_for('dashboard'))
+    if terminal_id != TERMINAL_TODAS and not existe_terminal(terminal_id):
+        return redirect(url_for('dashboard'))
     
-    if terminal_id == 'TODAS':
-        ventas = Venta.query.all()
+    if terminal_id == TERMINAL_TODAS:
+        stats_avanzadas = estadisticas_dashboard()
         terminal_nombre = "General (Todas las Terminales)"
     else:
-        ventas = Venta.query.filter_by(id_terminal=terminal_id).all()
+        stats_avanzadas = estadisticas_dashboard(terminal_id)
         terminal_nombre = f"Terminal {terminal_id}"
     
-    if ventas:
-        ids_venta_unicos = len(set(v.id_venta for v in ventas))
-        ingresos_totales = sum(v.total_venta for v in ventas)
-        ventas_hoy = [v for v in ventas if v.fecha == date.today()]
-        ventas_hoy_count = len(set(v.id_venta for v in ventas_hoy))
-    else:
-        ids_venta_unicos = 0
-        ingresos_totales = 0
-        ventas_hoy_count = 0
+    resumen = stats_avanzadas['resumen']
+    ingresos_totales = resumen['ingresos']
     
     productos_disponibles = Producto.query.filter_by(estado='Disponible').count()
     
     stats = {
-        'ventas_totales': ids_venta_unicos,
+        'ventas_totales': resumen['tickets'],
         'ingresos_totales': f"{CONFIG['moneda']}{ingresos_totales:,.2f}",
         'productos_catalogo': productos_disponibles,
-        'usuarios_activos': 1,
-        'ventas_hoy_count': ventas_hoy_count,
+        'usuarios_activos': len(obtener_registro().usuarios),
+        'ventas_hoy_count': resumen['tickets_hoy'],
         'dashboard_nombre': f"Dashboard - {terminal_nombre}",
         'terminal_actual': terminal_id
     }
     
     return render_template('dashboard.html',
                          stats=stats,
+                         stats_avanzadas=stats_avanzadas,
                          empresa=CONFIG['empresa'],
                          rol_actual=rol,
                          terminal_actual=terminal,
+                         terminales=terminales_activas(),
                          now=datetime.now())
 
 @app.route('/editor-catalogo')
@@ -218,9 +356,7 @@ def obtener_producto(producto_nombre):
         
         logger.info(f"🔍 Buscando producto: '{producto_limpio}'")
         
-        producto = Producto.query.filter(
-            db.func.lower(Producto.nombre) == producto_limpio.lower()
-        ).first()
+        producto = Producto.buscar_por_nombre(producto_limpio)
         
         if producto:
             logger.info(f"✅ Producto encontrado: {producto.nombre}")
@@ -263,9 +399,7 @@ def actualizar_producto():
         except (ValueError, TypeError):
             return jsonify({'success': False, 'message': 'Precio inválido'}), 400
         
-        producto = Producto.query.filter(
-            db.func.lower(Producto.nombre) == producto_original.lower()
-        ).first()
+        producto = Producto.buscar_por_nombre(producto_original)
         
         if not producto:
             return jsonify({'success': False, 'message': f'Producto no encontrado: {producto_original}'}), 404
@@ -275,6 +409,7 @@ def actualizar_producto():
         producto.subcategoria = nueva_subcategoria
         producto.precio_venta = precio_float
         producto.proveedor = nuevo_proveedor
+        invalidar_catalogo()
         
         db.session.commit()
         logger.info(f"✅ Producto actualizado en BD: {nuevo_nombre}")
@@ -318,9 +453,7 @@ def agregar_producto():
         except (ValueError, TypeError):
             return jsonify({'success': False, 'message': 'Precio inválido'}), 400
         
-        existente = Producto.query.filter(
-            db.func.lower(Producto.nombre) == nombre.lower()
-        ).first()
+        existente = Producto.buscar_por_nombre(nombre)
         
         if existente:
             return jsonify({'success': False, 'message': f'El producto "{nombre}" ya existe'}), 400
@@ -335,6 +468,7 @@ def agregar_producto():
         )
         
         db.session.add(nuevo_producto)
+        invalidar_catalogo()
         db.session.commit()
         logger.info(f"✅ Producto agregado a BD: {nombre}")
         
@@ -366,14 +500,13 @@ def eliminar_producto():
         
         logger.info(f"🗑️ Intentando eliminar producto: {producto_nombre}")
         
-        producto = Producto.query.filter(
-            db.func.lower(Producto.nombre) == producto_nombre.lower()
-        ).first()
+        producto = Producto.buscar_por_nombre(producto_nombre)
         
         if not producto:
             return jsonify({'success': False, 'message': f'Producto no encontrado: {producto_nombre}'}), 404
         
         db.session.delete(producto)
+        invalidar_catalogo()
         db.session.commit()
         logger.info(f"✅ Producto eliminado de BD: {producto_nombre}")
         
@@ -387,19 +520,148 @@ def eliminar_producto():
         logger.error(f"❌ Error eliminando producto: {str(e)}")
         return jsonify({'success': False, 'message': f'Error interno: {str(e)}'}), 500
 
+@app.route('/importar-catalogo', methods=['POST'])
+@admin_required
+def importar_catalogo_excel():
+    try:
+        archivo = request.files.get('archivo')
+        if not archivo or not archivo.filename:
+            return jsonify({'success': False, 'message': 'No se recibió ningún archivo'}), 400
+        
+        from importar_catalogo import importar_catalogo
+        resumen = importar_catalogo(
+            archivo,
+            nombre_archivo=archivo.filename,
+            desactivar_faltantes=request.form.get('desactivar_faltantes', 'true') == 'true',
+            simular=request.form.get('simular') == 'true'
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': f"Catálogo procesado: {resumen['altas']} altas, {resumen['modificaciones']} modificaciones, {resumen['bajas']} bajas",
+            'resumen': resumen
+        })
+    
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"❌ Error importando catálogo: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error interno: {str(e)}'}), 500
+
 @app.route('/buscar-productos')
 def buscar_productos():
     query = request.args.get('q', '').strip()
     if len(query) < 2:
         return jsonify([])
     
-    productos = Producto.query.filter(
-        Producto.nombre.ilike(f'%{query}%'),
-        Producto.estado == 'Disponible'
-    ).limit(10).all()
+    indice_productos.sincronizar(obtener_catalogo())
+    productos = indice_productos.buscar(query, limite=10)
     
     return jsonify([p.nombre for p in productos])
 
+@app.route('/detalles-producto/<path:producto_nombre>')
+@login_required
+def detalles_producto(producto_nombre):
+    producto = Producto.buscar_por_nombre(unquote(producto_nombre))
+    if not producto or producto.estado != 'Disponible':
+        return jsonify({'error': 'Producto no encontrado'}), 404
+    
+    return jsonify({
+        'nombre': producto.nombre,
+        'precio': producto.precio_venta,
+        'categoria': producto.categoria,
+        'subcategoria': producto.subcategoria,
+        'proveedor': producto.proveedor
+    })
+
+@app.route('/catalogo-productos')
+@login_required
+def catalogo_productos():
+    """Página del catálogo disponible, filtrable por categoría y texto, con ETag por versión"""
+    try:
+        pagina = max(1, int(request.args.get('pagina', 1)))
+        por_pagina = min(PRODUCTOS_POR_PAGINA_MAX, max(1, int(request.args.get('por_pagina', PRODUCTOS_POR_PAGINA))))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Parámetros de paginación inválidos'}), 400
+    categoria = request.args.get('categoria', '').strip()
+    query = request.args.get('q', '').strip()
+
+    catalogo = obtener_catalogo()
+    # El contenido de cada URL solo cambia con la versión del catálogo
+    etag = f'catalogo-{catalogo.version}'
+    if request.if_none_match.contains(etag):
+        respuesta = Response(status=304)
+        respuesta.set_etag(etag)
+        return respuesta
+
+    inicio = (pagina - 1) * por_pagina
+    if len(query) >= 2:
+        indice_productos.sincronizar(catalogo)
+        candidatos = indice_productos.buscar(query, limite=inicio + por_pagina + 1, categoria=categoria or None)
+        total = len(candidatos) if len(candidatos) <= inicio + por_pagina else None
+    elif categoria:
+        candidatos = [p for p in catalogo.productos if p.categoria == categoria]
+        total = len(candidatos)
+    else:
+        candidatos = catalogo.productos
+        total = len(candidatos)
+
+    respuesta = jsonify({
+        'success': True,
+        'version': catalogo.version,
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'total': total,
+        'hay_mas': len(candidatos) > inicio + por_pagina,
+        'productos': [
+            {
+                'id': p.id,
+                'nombre': p.nombre,
+                'categoria': p.categoria,
+                'subcategoria': p.subcategoria,
+                'precio_venta': p.precio_venta
+            }
+            for p in candidatos[inicio:inicio + por_pagina]
+        ]
+    })
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+@app.route('/catalogo-snapshot')
+@login_required
+def catalogo_snapshot():
+    """Catálogo completo en columnas y comprimido, o solo los cambios desde una marca anterior"""
+    desde = request.args.get('desde')
+    marca = parsear_marca(desde) if desde else None
+    if desde and marca is None:
+        return jsonify({'success': False, 'message': 'Marca de snapshot inválida'}), 400
+
+    # La versión se lee antes que los datos: el snapshot nunca es más viejo que su ETag
+    version = version_catalogo()
+    etag = f'snapshot-{version}'
+    # Débil: el cuerpo gzip y el plano son el mismo snapshot pero no los mismos bytes
+    if request.if_none_match.contains_weak(etag):
+        respuesta = Response(status=304)
+        respuesta.set_etag(etag, weak=True)
+        return respuesta
+
+    if marca is None:
+        cuerpo, comprimido = snapshot_completo(version)
+    else:
+        cuerpo, comprimido = serializar(construir_snapshot(version, marca)), None
+
+    respuesta = Response(mimetype='application/json')
+    if 'gzip' in request.accept_encodings:
+        respuesta.set_data(comprimido or gzip.compress(cuerpo))
+        respuesta.headers['Content-Encoding'] = 'gzip'
+    else:
+        respuesta.set_data(cuerpo)
+    respuesta.set_etag(etag, weak=True)
+    respuesta.headers['Vary'] = 'Accept-Encoding'
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
 @app.route('/agregar-carrito', methods=['POST'])
 @login_required
 def agregar_carrito():
@@ -411,135 +673,261 @@ def agregar_carrito():
         if not producto_nombre or cantidad <= 0:
             return jsonify({'success': False, 'message': 'Datos inválidos'}), 400
         
-        producto = Producto.query.filter(
-            db.func.lower(Producto.nombre) == producto_nombre.lower()
-        ).first()
+        producto = Producto.buscar_por_nombre(producto_nombre)
         
         if not producto:
             return jsonify({'success': False, 'message': 'Producto no encontrado'}), 404
         
-        carrito = get_carrito()
-        
         item = {
             'producto': producto.nombre,
             'cantidad': cantidad,
             'precio': producto.precio_venta,
-            'subtotal': cantidad * producto.precio_venta,
+            'subtotal': a_pesos(subtotal_linea(producto.precio_venta, cantidad)),
             'proveedor': producto.proveedor,
             'categoria': producto.categoria,
             'timestamp': datetime.now().isoformat()
         }
         
-        carrito.append(item)
-        session[f'carrito_{session.get("usuario")}'] = carrito
-        
-        subtotal = sum(i['subtotal'] for i in carrito)
-        iva = subtotal * 0.21
-        total = subtotal + iva
-        
-        return jsonify({
-            'success': True,
-            'message': f'{producto.nombre} agregado al carrito',
-            'carrito': carrito,
-            'totales': {
-                'subtotal': round(subtotal, 2),
-                'iva': round(iva, 2),
-                'total': round(total, 2),
-                'porcentaje_iva': 21
-            }
-        })
+        cambio = carritos.agregar(get_carrito_id(), item)
+        return respuesta_carrito(f'{producto.nombre} agregado al carrito', cambio)
         
     except Exception as e:
         logger.error(f"Error en agregar-carrito: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
+@app.route('/actualizar-carrito/<int:linea_id>', methods=['PUT'])
+@login_required
+def actualizar_carrito(linea_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        cantidad = int(data.get('cantidad', 0))
+    except (TypeError, ValueError):
+        cantidad = 0
+    if cantidad <= 0:
+        return jsonify({'success': False, 'message': 'Cantidad inválida'}), 400
+    
+    try:
+        cambio = carritos.actualizar(get_carrito_id(), linea_id, cantidad)
+    except Exception as e:
+        logger.error(f"Error en actualizar-carrito: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+    if cambio is None:
+        return jsonify({'success': False, 'message': 'El producto ya no está en el carrito'}), 404
+    return respuesta_carrito('Cantidad actualizada', cambio)
+
+@app.route('/eliminar-carrito/<int:linea_id>', methods=['DELETE'])
+@login_required
+def eliminar_carrito(linea_id):
+    try:
+        cambio = carritos.eliminar(get_carrito_id(), linea_id)
+    except Exception as e:
+        logger.error(f"Error en eliminar-carrito: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+    if cambio is None:
+        return jsonify({'success': False, 'message': 'El producto ya no está en el carrito'}), 404
+    return respuesta_carrito('Producto eliminado del carrito', cambio)
+
+@app.route('/limpiar-carrito', methods=['DELETE'])
+@login_required
+def limpiar_carrito():
+    try:
+        carritos.vaciar(get_carrito_id())
+    except Exception as e:
+        logger.error(f"Error en limpiar-carrito: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+    return jsonify({
+        'success': True,
+        'message': 'Carrito vacío',
+        'carrito': [],
+        'totales': calcular_totales({'lineas': 0, 'unidades': 0, 'subtotal_centavos': 0})
+    })
+
 @app.route('/finalizar-venta', methods=['POST'])
 @login_required
 def finalizar_venta():
     try:
-        carrito = get_carrito()
-        terminal_id = session.get('terminal')
-        usuario = session.get('usuario')
+        data = request.get_json(silent=True) or {}
+        clave = request.headers.get('Idempotency-Key') or data.get('clave')
+        clave = validar_clave(clave) if clave else None
+        lineas = _lineas_a_cobrar(data.get('lineas'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    if not clave:
+        return _registrar_checkout(None, lineas)
+
+    # Reintento de un checkout ya registrado: se contesta desde memoria o claves_venta
+    terminal_id = session.get('terminal')
+    resumen = resumenes_guardados(terminal_id, [clave]).get(clave)
+    if resumen:
+        return _venta_ya_registrada(resumen)
+
+    if not claves_recientes.reservar((terminal_id, clave)):
+        return _venta_en_proceso()
+    try:
+        # El primer intento pudo terminar entre la consulta anterior y la reserva
+        resumen = resumenes_guardados(terminal_id, [clave]).get(clave)
+        if resumen:
+            return _venta_ya_registrada(resumen)
+        return _registrar_checkout(clave, lineas)
+    finally:
+        claves_recientes.liberar((terminal_id, clave))
+
+def _lineas_a_cobrar(lineas):
+    """Ids de las líneas que el POS tenía en pantalla al cobrar; None para cobrar todo el carrito"""
+    if lineas is None:
+        return None
+    if not isinstance(lineas, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in lineas):
+        raise ValueError('lineas debe ser una lista de ids de línea')
+    return set(lineas)
+
+def _venta_ya_registrada(resumen):
+    return jsonify({'success': True, 'message': 'Venta ya registrada', 'resumen': resumen})
+
+def _venta_en_proceso():
+    return jsonify({'success': False, 'message': 'La venta se está procesando, reintente en unos segundos'}), 409
+
+def _registrar_checkout(clave, lineas=None):
+    terminal_id = session.get('terminal')
+    try:
+        carrito_id = get_carrito_id()
+        carrito = carritos.obtener(carrito_id)
+        if lineas is not None:
+            # Un cobro que llega tarde (el POS ya lo encoló y siguió vendiendo) no se lleva lo agregado después
+            carrito = [linea for linea in carrito if linea['id'] in lineas]
         
         if not carrito:
             return jsonify({'success': False, 'message': 'El carrito está vacío'}), 400
         
-        contador = Contador.query.filter_by(terminal=terminal_id).first()
-        if not contador:
+        numeracion = asignador_tickets.siguiente(terminal_id)
+        if numeracion is None:
             return jsonify({'success': False, 'message': 'Terminal no configurada'}), 500
         
-        id_cliente = contador.ultimo_cliente + 1
-        id_venta_actual = contador.ultima_venta + 1
-        fecha = date.today()
-        hora = datetime.now().time()
-        
-        for item in carrito:
-            venta = Venta(
-                id_venta=id_venta_actual,
-                fecha=fecha,
-                hora=hora,
-                id_cliente=f"CLIENTE-{terminal_id}-{id_cliente:04d}",
-                producto_nombre=item['producto'],
-                cantidad=item['cantidad'],
-                precio_unitario=item['precio'],
-                total_venta=item['subtotal'],
-                vendedor=f'POS {terminal_id}',
-                id_terminal=terminal_id
-            )
-            db.session.add(venta)
-        
-        contador.ultimo_cliente = id_cliente
-        contador.ultima_venta = id_venta_actual
-        contador.total_ventas += 1
+        id_venta_actual, id_cliente = numeracion
         
-        db.session.commit()
+        resumen, = guardar_tickets(terminal_id, [{
+            'items': carrito,
+            'id_venta': id_venta_actual,
+            'numero_cliente': id_cliente,
+            'fecha': date.today(),
+            'hora': datetime.now().time(),
+            'clave': clave
+        }])
         
-        subtotal = sum(i['subtotal'] for i in carrito)
-        iva = subtotal * 0.21
-        total = subtotal + iva
+        db.session.commit()
+        if clave:
+            claves_recientes.guardar((terminal_id, clave), resumen)
         
-        session[f'carrito_{usuario}'] = []
+        carritos.quitar(carrito_id, [linea['id'] for linea in carrito])
         
-        logger.info(f"✅ Venta finalizada: {id_venta_actual} - Terminal {terminal_id} - ${total:,.2f}")
+        logger.info(f"✅ Venta finalizada: {id_venta_actual} - Terminal {terminal_id} - ${resumen['totales']['total']:,.2f}")
         
         return jsonify({
             'success': True,
             'message': 'Venta finalizada exitosamente',
-            'resumen': {
-                'id_venta': id_venta_actual,
-                'id_cliente': f"CLIENTE-{terminal_id}-{id_cliente:04d}",
-                'total_productos': len(carrito),
-                'totales': {
-                    'subtotal': round(subtotal, 2),
-                    'iva': round(iva, 2),
-                    'total': round(total, 2)
-                },
-                'fecha': str(fecha),
-                'hora': str(hora)
-            }
+            'resumen': resumen
         })
         
+    except IntegrityError as e:
+        db.session.rollback()
+        # El mismo checkout se registró en otro worker: se contesta con ese ticket
+        resumen = resumenes_guardados(terminal_id, [clave]).get(clave) if clave else None
+        if resumen:
+            logger.warning(f"⚠️ Clave de venta registrada en paralelo - Terminal {terminal_id}")
+            return _venta_ya_registrada(resumen)
+        logger.error(f"Error en finalizar-venta: {str(e)}")
+        return jsonify({'success': False, 'message': 'No se pudo registrar la venta, reintente'}), 500
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error en finalizar-venta: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
+@app.route('/sincronizar-ventas', methods=['POST'])
+@login_required
+def sincronizar_ventas():
+    """Recibe en lote los tickets que la terminal registró sin conexión"""
+    data = request.get_json(silent=True) or {}
+    tickets = data.get('tickets')
+    if not isinstance(tickets, list) or not tickets:
+        return jsonify({'success': False, 'message': 'No se recibieron tickets'}), 400
+    if len(tickets) > MAXIMO_TICKETS_POR_LOTE:
+        return jsonify({'success': False, 'message': f'Máximo {MAXIMO_TICKETS_POR_LOTE} tickets por lote'}), 400
+
+    terminal_id = session.get('terminal')
+    try:
+        resultados = sincronizar_tickets(terminal_id, tickets, asignador_tickets)
+    except LookupError as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"❌ Error sincronizando ventas: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+    return jsonify({'success': True, 'resultados': resultados})
+
+@app.route('/exportar-ventas')
+@login_required
+def exportar_ventas():
+    from exportar import FORMATOS as FORMATOS_EXPORTACION
+    formato = request.args.get('formato', 'csv').lower()
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({'error': 'Formato inválido', 'message': 'Formatos disponibles: csv, xlsx'}), 400
+    
+    try:
+        desde = date.fromisoformat(request.args['desde']) if request.args.get('desde') else None
+        hasta = date.fromisoformat(request.args['hasta']) if request.args.get('hasta') else None
+    except ValueError:
+        return jsonify({'error': 'Fecha inválida', 'message': 'Usar el formato AAAA-MM-DD'}), 400
+    
+    terminal = request.args.get('terminal') or None
+    if session.get('rol') != 'admin':
+        terminal = session.get('terminal')
+    elif terminal == TERMINAL_TODAS:
+        terminal = None
+    
+    generador, mimetype = FORMATOS_EXPORTACION[formato]
+    nombre_archivo = f"ventas_{terminal or TERMINAL_TODAS}_{desde or 'inicio'}_{hasta or date.today()}.{formato}"
+    logger.info(f"📤 Exportando ventas: {nombre_archivo}")
+    
+    return Response(
+        stream_with_context(generador(desde, hasta, terminal)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{nombre_archivo}"'}
+    )
+
 @app.route('/diagnostico')
 def diagnostico():
     try:
         productos_count = Producto.query.count()
-        ventas_count = Venta.query.count()
+        tickets_count = Ticket.query.count()
+        lineas_count = LineaVenta.query.count()
         
         return jsonify({
             'status': 'OK',
             'mensaje': 'Sistema POCOPAN operativo con BD',
             'productos': productos_count,
-            'ventas_registradas': ventas_count,
+            'ventas_registradas': tickets_count,
+            'lineas_registradas': lineas_count,
             'database': 'PostgreSQL' if 'postgresql' in DATABASE_URL else 'SQLite'
         })
     except Exception as e:
         return jsonify({'status': 'ERROR', 'mensaje': str(e)}), 500
 
+def _acceso_metricas():
+    if session.get('rol') == 'admin':
+        return True
+    autorizacion = request.headers.get('Authorization', '')
+    return bool(METRICAS_TOKEN) and autorizacion.startswith('Bearer ') and hmac.compare_digest(
+        autorizacion[len('Bearer '):].encode('utf-8'), METRICAS_TOKEN.encode('utf-8')
+    )
+
+@app.route('/metrics')
+def metrics():
+    # Las métricas muestran rutas y SQL: sin permiso la ruta no existe
+    if not _acceso_metricas():
+        return render_template('error.html', mensaje="Página no encontrada"), 404
+    return metricas.respuesta()
+
 @app.errorhandler(404)
 def not_found(error):
     return render_template('error.html', mensaje="Página no encontrada"), 404
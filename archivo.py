@@ -0,0 +1,217 @@
+from collections import defaultdict, namedtuple
+from datetime import date, timedelta
+import logging
+import os
+
+from sqlalchemy import distinct, func
+
+from dinero import a_pesos
+from models import db, Ticket, LineaVenta
+
+logger = logging.getLogger(__name__)
+
+# Sin valor por defecto: las ventas se borran de la base al archivarlas, así que el
+# directorio tiene que ser durable y compartido (no el disco efímero de Vercel o de un host)
+DIRECTORIO_ARCHIVO = os.getenv('ARCHIVO_VENTAS_DIR')
+DIAS_EN_CALIENTE = int(os.getenv('ARCHIVO_DIAS_CALIENTES', '7'))
+FILAS_POR_LOTE = 5000
+
+# fecha e id_terminal no se guardan dentro del archivo: salen del nombre de la partición
+COLUMNAS = ['id', 'id_venta', 'hora', 'id_cliente', 'producto_nombre', 'cantidad',
+            'precio_unitario', 'total_venta', 'vendedor']
+FilaArchivada = namedtuple('FilaArchivada', ['id', 'id_venta', 'fecha', 'hora', 'id_cliente', 'producto_nombre',
+                                             'cantidad', 'precio_unitario', 'total_venta', 'vendedor', 'id_terminal'])
+
+def _esquema():
+    import pyarrow as pa
+    return pa.schema([
+        ('id', pa.int64()),
+        ('id_venta', pa.int64()),
+        ('hora', pa.time64('us')),
+        ('id_cliente', pa.string()),
+        ('producto_nombre', pa.string()),
+        ('cantidad', pa.int64()),
+        ('precio_unitario', pa.float64()),
+        ('total_venta', pa.float64()),
+        ('vendedor', pa.string())
+    ])
+
+def _ruta_particion(fecha, terminal):
+    return os.path.join(DIRECTORIO_ARCHIVO, f'fecha={fecha.isoformat()}', f'id_terminal={terminal}', 'ventas.parquet')
+
+def hay_archivo():
+    """Evita importar pyarrow mientras no haya nada archivado"""
+    return bool(DIRECTORIO_ARCHIVO) and os.path.isdir(DIRECTORIO_ARCHIVO) and any(os.scandir(DIRECTORIO_ARCHIVO))
+
+def _dataset():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    campos_particion = pa.schema([('fecha', pa.string()), ('id_terminal', pa.string())])
+    esquema = pa.unify_schemas([_esquema(), campos_particion])
+    particiones = ds.partitioning(campos_particion, flavor='hive')
+    return ds.dataset(DIRECTORIO_ARCHIVO, format='parquet', schema=esquema, partitioning=particiones)
+
+def _filtro(desde=None, hasta=None, terminal=None):
+    import pyarrow.dataset as ds
+
+    condiciones = []
+    if desde:
+        condiciones.append(ds.field('fecha') >= desde.isoformat())
+    if hasta:
+        condiciones.append(ds.field('fecha') <= hasta.isoformat())
+    if terminal:
+        condiciones.append(ds.field('id_terminal') == terminal)
+    filtro = None
+    for condicion in condiciones:
+        filtro = condicion if filtro is None else filtro & condicion
+    return filtro
+
+def _escribir_particion(fecha, terminal, filas):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tabla = pa.Table.from_pylist([{c: getattr(f, c) for c in COLUMNAS} for f in filas], schema=_esquema())
+    ruta = _ruta_particion(fecha, terminal)
+    if os.path.exists(ruta):
+        # Ventas de un día ya archivado que llegaron tarde (cola sin conexión) o una
+        # corrida anterior que no llegó a borrar las filas: se unen sin repetir ids
+        anterior = pq.read_table(ruta, schema=_esquema())
+        nuevos = set(tabla.column('id').to_pylist())
+        conservar = [i not in nuevos for i in anterior.column('id').to_pylist()]
+        tabla = pa.concat_tables([anterior.filter(pa.array(conservar)), tabla]).sort_by('id')
+
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    # Los archivos que empiezan con punto no los lee pyarrow.dataset si la escritura queda a medias
+    temporal = os.path.join(os.path.dirname(ruta), '.ventas.parquet.tmp')
+    pq.write_table(tabla, temporal, compression='zstd')
+    os.replace(temporal, ruta)
+
+def _lineas_a_archivar(fecha, ultimo_ticket):
+    """Líneas del día con los datos de su ticket, en pesos como en las particiones ya escritas"""
+    filas = db.session.execute(
+        db.select(
+            LineaVenta.id, Ticket.id_venta, Ticket.hora, Ticket.id_cliente, LineaVenta.producto_nombre,
+            LineaVenta.cantidad, LineaVenta.precio_centavos, Ticket.vendedor, Ticket.id_terminal
+        )
+        .join(Ticket, LineaVenta.ticket_id == Ticket.id)
+        .where(Ticket.fecha == fecha, Ticket.id <= ultimo_ticket)
+        .order_by(Ticket.id_terminal, LineaVenta.id)
+    )
+    return [
+        FilaArchivada(f.id, f.id_venta, fecha, f.hora, f.id_cliente, f.producto_nombre, f.cantidad,
+                      a_pesos(f.precio_centavos), a_pesos(f.precio_centavos * f.cantidad), f.vendedor, f.id_terminal)
+        for f in filas
+    ]
+
+def archivar_ventas(dias_calientes=DIAS_EN_CALIENTE, hoy=None):
+    """Mueve a Parquet los días cerrados de ventas, un día por transacción.
+
+    Quedan en la tabla los últimos `dias_calientes` días (hoy incluido). Cada
+    partición se escribe antes de borrar sus tickets y líneas, así una corrida
+    interrumpida se puede repetir sin perder ni duplicar ventas.
+    """
+    if not DIRECTORIO_ARCHIVO:
+        raise RuntimeError('ARCHIVO_VENTAS_DIR no está configurado: indicar un directorio durable antes de archivar')
+
+    hoy = hoy or date.today()
+    limite = hoy - timedelta(days=max(1, dias_calientes) - 1)
+
+    fechas = db.session.execute(
+        db.select(distinct(Ticket.fecha)).where(Ticket.fecha < limite).order_by(Ticket.fecha)
+    ).scalars().all()
+
+    total = 0
+    for fecha in fechas:
+        # Los tickets que entren mientras se archiva quedan para la próxima corrida
+        ultimo_ticket = db.session.execute(db.select(func.max(Ticket.id)).where(Ticket.fecha == fecha)).scalar()
+        filas = _lineas_a_archivar(fecha, ultimo_ticket)
+
+        por_terminal = defaultdict(list)
+        for fila in filas:
+            por_terminal[fila.id_terminal].append(fila)
+        for terminal, filas_terminal in por_terminal.items():
+            _escribir_particion(fecha, terminal, filas_terminal)
+
+        archivados = db.select(Ticket.id).where(Ticket.fecha == fecha, Ticket.id <= ultimo_ticket)
+        try:
+            db.session.execute(db.delete(LineaVenta).where(LineaVenta.ticket_id.in_(archivados)))
+            db.session.execute(db.delete(Ticket).where(Ticket.id.in_(archivados)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        total += len(filas)
+        logger.info(f"🗄️ {fecha}: {len(filas)} ventas archivadas en {len(por_terminal)} particiones")
+
+    return {'dias': len(fechas), 'filas': total}
+
+def iterar_archivo(desde=None, hasta=None, terminal=None):
+    """Filas archivadas en orden de fecha, de a FILAS_POR_LOTE, con los mismos campos que exportar.consulta_ventas"""
+    if not hay_archivo():
+        return
+
+    dataset = _dataset()
+    filtro = _filtro(desde, hasta, terminal)
+    fechas = sorted({
+        f for f in dataset.to_table(columns=['fecha'], filter=filtro).column('fecha').unique().to_pylist()
+    })
+    for dia in fechas:
+        fecha = date.fromisoformat(dia)
+        tabla = dataset.to_table(filter=_filtro(fecha, fecha, terminal)).sort_by([('id_terminal', 'ascending'), ('id', 'ascending')])
+        for lote in tabla.to_batches(FILAS_POR_LOTE):
+            columnas = lote.to_pydict()
+            yield [
+                FilaArchivada(
+                    columnas['id'][i], columnas['id_venta'][i], fecha, columnas['hora'][i],
+                    columnas['id_cliente'][i], columnas['producto_nombre'][i], columnas['cantidad'][i],
+                    columnas['precio_unitario'][i], columnas['total_venta'][i], columnas['vendedor'][i],
+                    columnas['id_terminal'][i]
+                )
+                for i in range(lote.num_rows)
+            ]
+
+def agregados_archivo(desde=None, hasta=None, terminal=None):
+    """Tickets, líneas, unidades e ingresos (en centavos) por fecha y terminal del archivo"""
+    if not hay_archivo():
+        return []
+
+    tabla = _dataset().to_table(
+        columns=['fecha', 'id_terminal', 'id_venta', 'cantidad', 'total_venta'],
+        filter=_filtro(desde, hasta, terminal)
+    )
+    df = tabla.to_pandas()
+    if df.empty:
+        return []
+    df['centavos'] = (df['total_venta'] * 100).round().astype('int64')
+    agrupado = df.groupby(['fecha', 'id_terminal']).agg(
+        tickets=('id_venta', 'nunique'),
+        lineas=('id_venta', 'size'),
+        unidades=('cantidad', 'sum'),
+        ingresos_centavos=('centavos', 'sum')
+    ).reset_index()
+    return [
+        {
+            'fecha': date.fromisoformat(f.fecha),
+            'id_terminal': f.id_terminal,
+            'tickets': int(f.tickets),
+            'lineas': int(f.lineas),
+            'unidades': int(f.unidades),
+            'ingresos_centavos': int(f.ingresos_centavos)
+        }
+        for f in agrupado.itertuples(index=False)
+    ]
+
+def ingresos_por_hora_archivo(desde=None, hasta=None, terminal=None):
+    """{(id_terminal, hora): ingresos} del archivo, para el mapa de calor"""
+    if not hay_archivo():
+        return {}
+
+    df = _dataset().to_table(
+        columns=['id_terminal', 'hora', 'total_venta'],
+        filter=_filtro(desde, hasta, terminal)
+    ).to_pandas()
+    if df.empty:
+        return {}
+    horas = df['hora'].map(lambda h: h.hour)
+    return df.groupby([df['id_terminal'], horas])['total_venta'].sum().to_dict()
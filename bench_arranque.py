@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""Arranque en frío: costo de `import app` por módulo y tiempo hasta la primera respuesta.
+
+Cada medición corre en un proceso nuevo, como una invocación fría de Vercel.
+Falla (código 1) si se importan módulos pesados al arrancar o si las medianas
+superan ARRANQUE_MAX_IMPORT_MS / ARRANQUE_MAX_PRIMERA_MS.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+REPETICIONES = int(os.getenv('BENCH_REPETICIONES', '5'))
+MAX_IMPORT_MS = float(os.getenv('ARRANQUE_MAX_IMPORT_MS', '1500'))
+MAX_PRIMERA_MS = float(os.getenv('ARRANQUE_MAX_PRIMERA_MS', '2500'))
+# Solo las rutas que los usan deberían cargarlos
+MODULOS_PESADOS = ['pandas', 'numpy', 'openpyxl', 'pyarrow']
+
+_PRIMERA_RESPUESTA = """
+import json, time
+inicio = time.perf_counter()
+from app import app
+importado = time.perf_counter()
+cliente = app.test_client()
+cliente.get('/login')
+login = time.perf_counter()
+cliente.post('/login', data={'usuario': 'pos1', 'password': 'pos1123'})
+cliente.get('/catalogo-productos')
+con_bd = time.perf_counter()
+print(json.dumps({
+    'import_ms': (importado - inicio) * 1000,
+    'login_ms': (login - inicio) * 1000,
+    'primera_bd_ms': (con_bd - inicio) * 1000
+}))
+"""
+
+def correr(argumentos, entorno):
+    return subprocess.run([sys.executable, *argumentos], cwd=DIRECTORIO, env=entorno,
+                          capture_output=True, text=True, check=True)
+
+def importtime(entorno):
+    """(módulo, profundidad, acumulado en µs) de `python -X importtime -c 'import app'`"""
+    salida = correr(['-X', 'importtime', '-c', 'import app'], entorno).stderr
+    modulos = []
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        _, acumulado, nombre = linea[len('import time:'):].split('|')
+        profundidad = (len(nombre) - len(nombre.lstrip()) - 1) // 2
+        modulos.append((nombre.strip(), profundidad, int(acumulado)))
+    return modulos
+
+if __name__ == '__main__':
+    directorio = tempfile.mkdtemp(prefix='pocopan_arranque_')
+    entorno = dict(os.environ)
+    entorno['DATABASE_URL'] = os.getenv('BENCH_DATABASE_URL') or f"sqlite:///{os.path.join(directorio, 'bench.db')}"
+    entorno.setdefault('CARRITO_BACKEND', 'memoria')
+
+    # La primera corrida crea el esquema; las siguientes miden el arranque con la base ya migrada
+    correr(['-c', 'from app import init_db; init_db()'], entorno)
+
+    modulos = importtime(entorno)
+    total = sum(us for _, profundidad, us in modulos if profundidad == 0)
+    print(f"📦 import app: {total / 1000:.1f} ms (imports directos de app más costosos)")
+    directos = [(nombre, us) for nombre, profundidad, us in modulos if profundidad == 1]
+    for nombre, us in sorted(directos, key=lambda m: m[1], reverse=True)[:15]:
+        print(f"   {nombre:<32} {us / 1000:8.1f} ms")
+
+    fallas = []
+    cargados = {nombre.split('.')[0] for nombre, _, _ in modulos}
+    pesados = [m for m in MODULOS_PESADOS if m in cargados]
+    if pesados:
+        fallas.append(f"módulos pesados importados al arrancar: {', '.join(pesados)}")
+
+    mediciones = [json.loads(correr(['-c', _PRIMERA_RESPUESTA], entorno).stdout.splitlines()[-1])
+                  for _ in range(REPETICIONES)]
+    medianas = {clave: statistics.median(m[clave] for m in mediciones) for clave in mediciones[0]}
+    print(f"⏱️  Mediana de {REPETICIONES} procesos: import {medianas['import_ms']:.0f} ms · "
+          f"/login {medianas['login_ms']:.0f} ms · primera request con BD {medianas['primera_bd_ms']:.0f} ms")
+
+    if medianas['import_ms'] > MAX_IMPORT_MS:
+        fallas.append(f"import app {medianas['import_ms']:.0f} ms > {MAX_IMPORT_MS:.0f} ms")
+    if medianas['primera_bd_ms'] > MAX_PRIMERA_MS:
+        fallas.append(f"primera request con BD {medianas['primera_bd_ms']:.0f} ms > {MAX_PRIMERA_MS:.0f} ms")
+
+    for falla in fallas:
+        print(f"❌ {falla}")
+    sys.exit(1 if fallas else 0)
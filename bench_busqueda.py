@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""Latencia del índice de búsqueda con un catálogo sintético de 100.000 productos"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from busqueda import IndiceBusqueda
+from catalogo_cache import Catalogo, ProductoCatalogo
+
+TOTAL_PRODUCTOS = 100000
+REPETICIONES = 20
+
+PALABRAS = (
+    "muñeco muñeca auto camión tren madera rompecabezas piezas juego mesa clásico cajas "
+    "granja animales dinos pelota bebé cocina bloques encastre didáctico memoria lotería "
+    "dominó cartas plastilina pinturas peluche oso conejo perro gato dinosaurio robot nave "
+    "avión barco pista carrera bici triciclo"
+).split()
+CATEGORIAS = ['Ingenio', 'Juego Meza', 'Puzzle', 'Figuras', 'Peluches', 'Vehículos', 'Arte', 'Bebés']
+CONSULTAS = ['mu', 'muñ', 'muneco', 'muneco ro', 'juego mesa clas', 'peluches', 'eco', 'pista au', 'bebe', 'zzz']
+
+def catalogo_sintetico():
+    random.seed(2311)
+    silabas = ['ma', 'ra', 'to', 'ce', 'li', 'pu', 'no', 'se', 'vi', 'go', 'ta', 'mo', 'fe', 'du', 'ri', 'ca']
+    vocabulario = PALABRAS + [''.join(random.choices(silabas, k=random.randint(2, 4))) for _ in range(5000)]
+    pesos = [1 / (i + 1) for i in range(len(vocabulario))]
+
+    productos = []
+    for i in range(TOTAL_PRODUCTOS):
+        nombre = ' '.join(random.choices(vocabulario, pesos, k=random.randint(2, 5))) + f' {i}'
+        categoria = random.choice(CATEGORIAS)
+        productos.append(ProductoCatalogo(i, nombre, categoria, f'Sub {categoria}', 1000.0, 'Proveedor'))
+    return Catalogo(1, tuple(productos), tuple(CATEGORIAS))
+
+if __name__ == '__main__':
+    catalogo = catalogo_sintetico()
+    indice = IndiceBusqueda(tamano_cache=0)
+
+    inicio = time.perf_counter()
+    indice.sincronizar(catalogo)
+    print(f"📦 Índice construido con {len(indice)} productos en {time.perf_counter() - inicio:.2f}s")
+
+    for consulta in CONSULTAS:
+        tiempos = []
+        for _ in range(REPETICIONES):
+            inicio = time.perf_counter()
+            resultados = indice.buscar(consulta)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        print(f"  {consulta!r:20} p50 {statistics.median(tiempos):.3f} ms  máx {max(tiempos):.3f} ms  ({len(resultados)} resultados)")
+
+    cambiado = catalogo.productos[0]._replace(precio_venta=2000.0)
+    inicio = time.perf_counter()
+    indice.sincronizar(Catalogo(2, (cambiado,) + catalogo.productos[1:], catalogo.categorias))
+    print(f"🔁 Sincronización de 1 cambio: {(time.perf_counter() - inicio) * 1000:.1f} ms")
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""Prueba de carga: N terminales que inician sesión, buscan, agregan al carrito y cobran en paralelo.
+
+Sin --url corre en el mismo proceso con el test client de Flask sobre una base
+SQLite temporal (o BENCH_DATABASE_URL) y da de alta las terminales POS1..POSN
+que falten, una por hilo. Con --url apunta a un servidor ya levantado, por
+ejemplo `gunicorn -w 4 app:app` contra PostgreSQL local.
+
+Los resultados (rendimiento y percentiles por ruta) se guardan como JSON en
+resultados_carga/ para comparar commits con --comparar.
+
+    python bench_carga.py --terminales 8 --tickets 25
+    python bench_carga.py --url http://127.0.0.1:8000 --comparar resultados_carga/anterior.json
+"""
+import argparse
+from collections import defaultdict
+from datetime import datetime
+import http.cookiejar
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_RESULTADOS = os.path.join(DIRECTORIO, 'resultados_carga')
+
+# Usuarios de terminal que crea la migración inicial; contra un servidor con --url se reparten en ronda
+USUARIOS_POS = [('pos1', 'pos1123'), ('pos2', 'pos2123'), ('pos3', 'pos3123')]
+
+def usuarios_pos(cantidad):
+    """Usuario y contraseña de las terminales POS1..POSN, con la convención de la migración inicial"""
+    return [(f'pos{n}', f'pos{n}123') for n in range(1, cantidad + 1)]
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+class ClienteLocal:
+    """Test client de Flask con la misma interfaz que ClienteHttp"""
+
+    def __init__(self, app):
+        self._cliente = app.test_client()
+
+    def pedir(self, metodo, ruta, json_data=None, form=None, headers=None):
+        resp = self._cliente.open(ruta, method=metodo, json=json_data, data=form, headers=headers)
+        return resp.status_code, resp.get_json(silent=True)
+
+class ClienteHttp:
+    """Cliente urllib con cookies de sesión contra un servidor real"""
+
+    def __init__(self, url_base):
+        self._url_base = url_base.rstrip('/')
+        self._abridor = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def pedir(self, metodo, ruta, json_data=None, form=None, headers=None):
+        cuerpo = None
+        headers = dict(headers or {})
+        if json_data is not None:
+            cuerpo = json.dumps(json_data).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            cuerpo = urllib.parse.urlencode(form).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        peticion = urllib.request.Request(self._url_base + ruta, data=cuerpo, method=metodo, headers=headers)
+        try:
+            with self._abridor.open(peticion, timeout=30) as resp:
+                estado, contenido = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            estado, contenido = e.code, e.read()
+        try:
+            return estado, json.loads(contenido)
+        except ValueError:
+            return estado, None
+
+class Registro:
+    """Latencias y errores por ruta, compartido entre los hilos de las terminales"""
+
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def medir(self, cliente, ruta_nombre, metodo, ruta, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            estado, datos = cliente.pedir(metodo, ruta, **kwargs)
+        except OSError:
+            estado, datos = None, None
+        ms = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            self.latencias[ruta_nombre].append(ms)
+            if estado is None or estado >= 400:
+                self.errores[ruta_nombre] += 1
+        return estado, datos
+
+def terminal(numero, crear_cliente, registro, tickets, terminos, usuarios, barrera, semilla):
+    """Un puesto de venta: login y luego `tickets` cobros de entre 1 y 4 productos buscados"""
+    azar = random.Random(semilla + numero)
+    cliente = crear_cliente()
+    usuario, password = usuarios[numero % len(usuarios)]
+
+    barrera.wait()
+    registro.medir(cliente, 'POST /login', 'POST', '/login', form={'usuario': usuario, 'password': password})
+    if terminos is None:
+        _, pagina = registro.medir(cliente, 'GET /catalogo-productos', 'GET', '/catalogo-productos?por_pagina=200')
+        terminos = terminos_de([p['nombre'] for p in (pagina or {}).get('productos', [])])
+
+    for _ in range(tickets):
+        agregados = 0
+        for _ in range(20):
+            if agregados:
+                break
+            termino = azar.choice(terminos)
+            _, encontrados = registro.medir(
+                cliente, 'GET /buscar-productos', 'GET', f'/buscar-productos?q={urllib.parse.quote(termino)}'
+            )
+            if not encontrados:
+                continue
+            for _ in range(azar.randint(1, 4)):
+                registro.medir(cliente, 'POST /agregar-carrito', 'POST', '/agregar-carrito',
+                               json_data={'producto': azar.choice(encontrados), 'cantidad': azar.randint(1, 3)})
+                agregados += 1
+
+        registro.medir(cliente, 'POST /finalizar-venta', 'POST', '/finalizar-venta',
+                       headers={'Idempotency-Key': uuid.uuid4().hex})
+
+def preparar_local(terminales):
+    """Importa la app contra una base temporal con `terminales` puestos y devuelve (app, nombres de productos, usuarios)"""
+    directorio = tempfile.mkdtemp(prefix='pocopan_carga_')
+    os.environ['DATABASE_URL'] = os.getenv('BENCH_DATABASE_URL') or f"sqlite:///{os.path.join(directorio, 'carga.db')}"
+    os.environ.setdefault('CARRITO_BACKEND', 'memoria')
+    sys.path.insert(0, DIRECTORIO)
+
+    from app import app, init_db
+    from catalogo_cache import obtener_catalogo
+    from models import db, Terminal, Usuario
+    from terminales import crear_terminal, crear_usuario, invalidar_registro
+
+    init_db()
+    usuarios = usuarios_pos(terminales)
+    with app.app_context():
+        for usuario, password in usuarios:
+            codigo = usuario.upper()
+            if not Terminal.query.filter_by(codigo=codigo).first():
+                crear_terminal(codigo)
+                db.session.flush()
+            if not Usuario.query.filter_by(usuario=usuario).first():
+                crear_usuario(usuario, password, terminal=codigo)
+        db.session.commit()
+        invalidar_registro()
+        nombres = [p.nombre for p in obtener_catalogo().productos]
+    return app, nombres, usuarios
+
+def terminos_de(nombres):
+    """Prefijos de palabras del catálogo, como los que tipea un cajero"""
+    terminos = {palabra[:3].lower() for nombre in nombres for palabra in nombre.split() if len(palabra) >= 3}
+    return sorted(terminos) or ['pan']
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DIRECTORIO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def resumir(registro, duracion):
+    rutas = {}
+    for ruta, latencias in sorted(registro.latencias.items()):
+        rutas[ruta] = {
+            'pedidos': len(latencias),
+            'errores': registro.errores[ruta],
+            'por_segundo': round(len(latencias) / duracion, 2),
+            'media_ms': round(statistics.fmean(latencias), 2),
+            'p50_ms': round(percentil(latencias, 50), 2),
+            'p90_ms': round(percentil(latencias, 90), 2),
+            'p99_ms': round(percentil(latencias, 99), 2),
+            'max_ms': round(max(latencias), 2)
+        }
+    return rutas
+
+def imprimir(resultado, anterior=None):
+    print(f"🧪 {resultado['terminales']} terminales × {resultado['tickets_por_terminal']} tickets contra "
+          f"{resultado['destino']} en {resultado['duracion_s']:.1f} s "
+          f"({resultado['tickets_por_segundo']:.1f} tickets/s)")
+    print(f"   {'ruta':<26} {'pedidos':>8} {'err':>5} {'req/s':>8} {'p50':>8} {'p90':>8} {'p99':>8}")
+    for ruta, datos in resultado['rutas'].items():
+        linea = (f"   {ruta:<26} {datos['pedidos']:>8} {datos['errores']:>5} {datos['por_segundo']:>8.1f} "
+                 f"{datos['p50_ms']:>8.2f} {datos['p90_ms']:>8.2f} {datos['p99_ms']:>8.2f}")
+        previo = (anterior or {}).get('rutas', {}).get(ruta)
+        if previo and previo['p50_ms']:
+            cambio = (datos['p50_ms'] - previo['p50_ms']) / previo['p50_ms'] * 100
+            linea += f"   p50 {cambio:+.0f}% vs {anterior.get('commit') or 'anterior'}"
+        print(linea)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--terminales', type=int, default=4, help='Terminales simuladas en paralelo')
+    parser.add_argument('--tickets', type=int, default=20, help='Tickets que cobra cada terminal')
+    parser.add_argument('--url', help='Servidor ya levantado; sin esto se usa el test client')
+    parser.add_argument('--semilla', type=int, default=2311)
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto en resultados_carga/)')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior para mostrar la diferencia')
+    args = parser.parse_args()
+
+    if args.url:
+        destino = args.url
+        with urllib.request.urlopen(args.url.rstrip('/') + '/login', timeout=30):
+            pass
+        crear_cliente = lambda: ClienteHttp(args.url)
+        # Sin acceso a la base: cada terminal arma los términos desde /catalogo-productos
+        terminos = None
+        usuarios = USUARIOS_POS
+    else:
+        app, nombres, usuarios = preparar_local(args.terminales)
+        destino = os.environ['DATABASE_URL'].split('://')[0]
+        crear_cliente = lambda: ClienteLocal(app)
+        terminos = terminos_de(nombres)
+
+    registro = Registro()
+    barrera = threading.Barrier(args.terminales + 1)
+    hilos = [
+        threading.Thread(target=terminal, args=(n, crear_cliente, registro, args.tickets, terminos, usuarios, barrera, args.semilla))
+        for n in range(args.terminales)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    barrera.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    cobros = registro.latencias['POST /finalizar-venta']
+    resultado = {
+        'commit': commit_actual(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'destino': destino,
+        'terminales': args.terminales,
+        'tickets_por_terminal': args.tickets,
+        'semilla': args.semilla,
+        'duracion_s': round(duracion, 3),
+        'tickets_por_segundo': round(len(cobros) / duracion, 2),
+        'rutas': resumir(registro, duracion)
+    }
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar) as archivo:
+            anterior = json.load(archivo)
+    imprimir(resultado, anterior)
+
+    salida = args.salida or os.path.join(
+        DIRECTORIO_RESULTADOS, f"carga-{resultado['commit'] or 'local'}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w') as archivo:
+        json.dump(resultado, archivo, indent=2)
+    print(f"💾 Resultados en {salida}")
+
+    return 1 if any(datos['errores'] for datos in resultado['rutas'].values()) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Latencia de /finalizar-venta (p50/p99) para carritos de 1, 10 y 100 líneas.
+
+Por defecto usa una base SQLite temporal; con BENCH_DATABASE_URL se puede
+apuntar a un PostgreSQL local.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+_directorio = tempfile.mkdtemp(prefix='pocopan_bench_')
+os.environ['DATABASE_URL'] = os.getenv('BENCH_DATABASE_URL') or f"sqlite:///{os.path.join(_directorio, 'bench.db')}"
+os.environ.setdefault('CARRITO_BACKEND', 'memoria')
+
+from app import app, init_db, carritos
+from models import db, Producto
+
+TAMANOS = [1, 10, 100]
+REPETICIONES = int(os.getenv('BENCH_REPETICIONES', '200'))
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def item_de(producto):
+    return {
+        'producto': producto.nombre,
+        'cantidad': 1,
+        'precio': producto.precio_venta,
+        'subtotal': producto.precio_venta,
+        'proveedor': producto.proveedor,
+        'categoria': producto.categoria
+    }
+
+if __name__ == '__main__':
+    init_db()
+    with app.app_context():
+        # Un producto distinto por línea: el carrito junta en una sola línea los agregados del mismo producto
+        faltantes = max(TAMANOS) - Producto.query.count()
+        if faltantes > 0:
+            db.session.add_all(
+                Producto(nombre=f'Producto bench {i:03d}', categoria='Bench', precio_venta=100.0 + i)
+                for i in range(faltantes)
+            )
+            db.session.commit()
+        items = [item_de(p) for p in Producto.query.all()]
+
+    cliente = app.test_client()
+    cliente.post('/login', data={'usuario': 'pos1', 'password': 'pos1123'})
+    cliente.get('/punto-venta')
+    with cliente.session_transaction() as sesion:
+        carrito_id = sesion['carrito_id']
+
+    print(f"🧪 Checkout contra {os.environ['DATABASE_URL'].split('://')[0]} ({REPETICIONES} tickets por tamaño)")
+    for tamano in TAMANOS:
+        tiempos = []
+        for _ in range(REPETICIONES):
+            for i in range(tamano):
+                carritos.agregar(carrito_id, items[i % len(items)])
+            inicio = time.perf_counter()
+            resp = cliente.post('/finalizar-venta')
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            assert resp.status_code == 200, resp.get_data(as_text=True)
+
+        print(f"  {tamano:>3} líneas: p50 {statistics.median(tiempos):7.2f} ms   p99 {percentil(tiempos, 99):7.2f} ms")
@@ -0,0 +1,317 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+import logging
+import re
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+_VACIO = frozenset()
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y con un solo espacio entre palabras ('Muñeco' -> 'muneco')"""
+    if not texto:
+        return ''
+    if texto.isascii():
+        # Sin acentos que quitar: es lo habitual en categorías y en buena parte de los nombres
+        return _NO_ALFANUMERICO.sub(' ', texto.lower()).strip()
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', sin_acentos.casefold()).strip()
+
+def _trigramas(palabra):
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+@lru_cache(maxsize=1024)
+def _grupos_de(categoria, subcategoria):
+    # Las categorías se repiten en todo el catálogo: se normalizan una vez por par
+    return frozenset({normalizar(categoria), normalizar(subcategoria)} - {''})
+
+def _desde(ordenada, clave):
+    """Recorre una lista ordenada a partir de la posición de `clave` sin copiarla"""
+    for i in range(bisect_left(ordenada, clave), len(ordenada)):
+        yield ordenada[i]
+
+class IndiceBusqueda:
+    """Índice en memoria sobre nombre, categoría y subcategoría del catálogo.
+
+    Las palabras de los nombres se indexan por prefijo (lista ordenada) y por
+    trigramas (para coincidencias en el medio de la palabra). Los resultados se
+    ordenan por nivel de coincidencia y alfabéticamente dentro de cada nivel.
+    """
+
+    UMBRAL_DENSO = 50
+    # Un paso del recorrido alfabético cuesta como COSTO_PASO elementos de una operación de conjuntos
+    COSTO_PASO = 2
+    # Con más de esta proporción del catálogo cambiada se rearma el índice entero
+    PROPORCION_RECONSTRUIR = 0.25
+
+    def __init__(self, tamano_cache=512):
+        self.version = None
+        self._lock = threading.Lock()
+        self._vaciar()
+        self._cache = OrderedDict()
+        self._tamano_cache = tamano_cache
+
+    def _vaciar(self):
+        self._docs = {}
+        self._nombres = {}
+        self._ordenados = []
+        self._palabras = defaultdict(set)
+        self._palabras_ordenadas = []
+        self._trigramas = defaultdict(set)
+        # Categoría y subcategoría normalizadas -> categoría exacta -> ids, para filtrar sin intersecar
+        self._grupos = defaultdict(lambda: defaultdict(set))
+        self._categorias = defaultdict(set)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _agregar(self, producto, ordenar=True):
+        """Indexa un producto; con ordenar=False las listas ordenadas quedan para ordenar al final"""
+        sumar = insort if ordenar else list.append
+        nombre = normalizar(producto.nombre)
+        self._docs[producto.id] = producto
+        self._nombres[producto.id] = nombre
+        sumar(self._ordenados, (nombre, producto.id))
+
+        for palabra in set(nombre.split()):
+            ids = self._palabras[palabra]
+            if not ids:
+                sumar(self._palabras_ordenadas, palabra)
+                for trigrama in _trigramas(palabra):
+                    self._trigramas[trigrama].add(palabra)
+            ids.add(producto.id)
+
+        for grupo in _grupos_de(producto.categoria, producto.subcategoria):
+            self._grupos[grupo][producto.categoria].add(producto.id)
+        self._categorias[producto.categoria].add(producto.id)
+
+    def _quitar(self, id_producto):
+        producto = self._docs.pop(id_producto)
+        nombre = self._nombres.pop(id_producto)
+        del self._ordenados[bisect_left(self._ordenados, (nombre, id_producto))]
+
+        for palabra in set(nombre.split()):
+            ids = self._palabras[palabra]
+            ids.discard(id_producto)
+            if not ids:
+                del self._palabras[palabra]
+                del self._palabras_ordenadas[bisect_left(self._palabras_ordenadas, palabra)]
+                for trigrama in _trigramas(palabra):
+                    palabras = self._trigramas[trigrama]
+                    palabras.discard(palabra)
+                    if not palabras:
+                        del self._trigramas[trigrama]
+
+        for grupo in _grupos_de(producto.categoria, producto.subcategoria):
+            por_categoria = self._grupos[grupo]
+            ids = por_categoria[producto.categoria]
+            ids.discard(id_producto)
+            if not ids:
+                del por_categoria[producto.categoria]
+                if not por_categoria:
+                    del self._grupos[grupo]
+
+        ids = self._categorias[producto.categoria]
+        ids.discard(id_producto)
+        if not ids:
+            del self._categorias[producto.categoria]
+
+    def _reconstruir(self, productos):
+        """Arma el índice desde cero ordenando una sola vez, en lugar de un insort por producto"""
+        self._vaciar()
+        for producto in productos:
+            self._agregar(producto, ordenar=False)
+        self._ordenados.sort()
+        self._palabras_ordenadas.sort()
+
+    def sincronizar(self, catalogo):
+        """Aplica al índice solo los productos que cambiaron desde la última versión indexada"""
+        if catalogo.version == self.version:
+            return
+
+        with self._lock:
+            if catalogo.version == self.version:
+                return
+
+            nuevos = {p.id: p for p in catalogo.productos}
+            quitados = [i for i in self._docs if i not in nuevos]
+            cambiados = [p for i, p in nuevos.items() if self._docs.get(i) != p]
+            cambios = len(quitados) + len(cambiados)
+
+            if not self._docs or cambios > len(nuevos) * self.PROPORCION_RECONSTRUIR:
+                self._reconstruir(nuevos.values())
+            else:
+                for id_producto in quitados:
+                    self._quitar(id_producto)
+                for producto in cambiados:
+                    if producto.id in self._docs:
+                        self._quitar(producto.id)
+                    self._agregar(producto)
+
+            self._cache.clear()
+            self.version = catalogo.version
+            logger.info(f"🔎 Índice de búsqueda v{catalogo.version}: {cambios} cambios, {len(self._docs)} productos")
+
+    @staticmethod
+    def _union(conjuntos):
+        conjuntos = [c for c in conjuntos if c]
+        if not conjuntos:
+            return _VACIO
+        if len(conjuntos) == 1:
+            return conjuntos[0]
+        return set().union(*conjuntos)
+
+    @staticmethod
+    def _interseccion(conjuntos):
+        conjuntos = sorted(conjuntos, key=len)
+        return conjuntos[0].intersection(*conjuntos[1:]) if len(conjuntos) > 1 else conjuntos[0]
+
+    def _con_prefijo(self, token):
+        """Conjuntos de productos de las palabras del nombre que empiezan con el token"""
+        conjuntos = []
+        for palabra in _desde(self._palabras_ordenadas, token):
+            if not palabra.startswith(token):
+                break
+            conjuntos.append(self._palabras[palabra])
+        return conjuntos
+
+    def _que_contienen(self, token):
+        """Conjuntos de productos de las palabras del nombre que contienen el token"""
+        if len(token) < 3:
+            return self._con_prefijo(token)
+        palabras = self._interseccion([self._trigramas.get(t, _VACIO) for t in _trigramas(token)])
+        return [self._palabras[p] for p in palabras if token in p]
+
+    def _en_grupos(self, token, categoria=None):
+        return [
+            ids
+            for grupo, por_categoria in self._grupos.items() if token in grupo
+            for categoria_grupo, ids in por_categoria.items() if categoria is None or categoria_grupo == categoria
+        ]
+
+    def _materializar(self, terminos):
+        """Productos que están en algún conjunto de cada término, partiendo del término más chico"""
+        candidatos = self._union(terminos[0])
+        for conjuntos in terminos[1:]:
+            if not candidatos:
+                break
+            candidatos = self._union([candidatos & c for c in conjuntos])
+        return candidatos
+
+    def _recorrer(self, cumple, faltan, tomados, tope=None):
+        """Recorre el orden alfabético global hasta juntar `faltan` ids; None si pasa `tope` pasos"""
+        encontrados = []
+        for paso, (_, id_producto) in enumerate(self._ordenados):
+            if tope is not None and paso > tope:
+                return None
+            if id_producto not in tomados and cumple(id_producto):
+                encontrados.append(id_producto)
+                if len(encontrados) == faltan:
+                    break
+        return encontrados
+
+    def _llenar(self, terminos, faltan, tomados):
+        """Hasta `faltan` ids no tomados que estén en algún conjunto de cada término, en orden alfabético.
+
+        Cada término es la lista de conjuntos de un token (palabras, grupos); no se
+        unen salvo que haga falta, porque las uniones de conjuntos grandes son lo caro.
+        """
+        total = len(self._docs)
+        terminos = sorted(terminos, key=lambda conjuntos: sum(map(len, conjuntos)))
+        menor = sum(map(len, terminos[0]))
+        if not total or not menor:
+            return []
+
+        # Coincidencias esperadas si los términos fueran independientes
+        estimado = total
+        for conjuntos in terminos:
+            estimado *= min(1.0, sum(map(len, conjuntos)) / total)
+
+        # Se recorre si se espera completar antes de lo que cuesta materializar; si la estimación
+        # falló (términos correlacionados), se abandona a las 4 veces lo esperado
+        pasos = faltan * total / estimado if estimado else total
+        limite_recorrido = menor / self.COSTO_PASO
+        if pasos < limite_recorrido:
+            def cumple(id_producto):
+                for conjuntos in terminos:
+                    for conjunto in conjuntos:
+                        if id_producto in conjunto:
+                            break
+                    else:
+                        return False
+                return True
+
+            encontrados = self._recorrer(cumple, faltan, tomados, min(4 * pasos, limite_recorrido))
+            if encontrados is not None:
+                return encontrados
+
+        candidatos = self._materializar(terminos)
+        if len(candidatos) > faltan * self.UMBRAL_DENSO:
+            return self._recorrer(candidatos.__contains__, faltan, tomados)
+        orden = sorted((self._nombres[i], i) for i in candidatos if i not in tomados)
+        return [id_producto for _, id_producto in orden[:faltan]]
+
+    def _rankear(self, consulta, limite, categoria=None):
+        permitidos = None if categoria is None else self._categorias.get(categoria, _VACIO)
+
+        # Nivel 0: el nombre empieza con la consulta (rango contiguo del orden alfabético)
+        resultado = []
+        for nombre, id_producto in _desde(self._ordenados, (consulta,)):
+            if len(resultado) == limite or not nombre.startswith(consulta):
+                break
+            if permitidos is None or id_producto in permitidos:
+                resultado.append(id_producto)
+
+        tokens = consulta.split()
+
+        # Nivel 1: cada token empieza una palabra del nombre; nivel 2: cada token aparece
+        # en el nombre; nivel 3: algún token solo aparece en la categoría o subcategoría
+        niveles = [
+            lambda: [self._con_prefijo(t) for t in tokens],
+            lambda: [self._que_contienen(t) for t in tokens],
+            lambda: [self._que_contienen(t) + self._en_grupos(t, categoria) for t in tokens],
+        ]
+
+        tomados = set(resultado)
+        for terminos in niveles:
+            faltan = limite - len(resultado)
+            if not faltan:
+                break
+            terminos = terminos()
+            if permitidos is not None:
+                terminos.append([permitidos])
+            nuevos = self._llenar(terminos, faltan, tomados)
+            resultado.extend(nuevos)
+            tomados.update(nuevos)
+        return resultado
+
+    def buscar(self, texto, limite=10, categoria=None):
+        """Productos que coinciden con el texto, de la mejor a la peor coincidencia.
+
+        Con `categoria` solo se rankean los productos de esa categoría exacta,
+        así una página filtrada no necesita pedir el catálogo entero.
+        """
+        consulta = normalizar(texto)
+        if len(consulta) < 2:
+            return []
+
+        clave_cache = (consulta, limite, categoria)
+        with self._lock:
+            resultado = self._cache.get(clave_cache)
+            if resultado is not None:
+                self._cache.move_to_end(clave_cache)
+                return resultado
+
+            resultado = [self._docs[i] for i in self._rankear(consulta, limite, categoria)]
+
+            self._cache[clave_cache] = resultado
+            if len(self._cache) > self._tamano_cache:
+                self._cache.popitem(last=False)
+            return resultado
+
+indice_productos = IndiceBusqueda()
@@ -0,0 +1,347 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import count
+import logging
+import threading
+import time
+
+from dinero import a_centavos, a_pesos, subtotal_linea
+from models import db, Carrito, CarritoItem
+from resumenes import insert_con_upsert
+
+logger = logging.getLogger(__name__)
+
+# Resultado de una modificación: id y contenido de la línea afectada (None si se quitó) y los totales acumulados
+CambioCarrito = namedtuple('CambioCarrito', ['id', 'linea', 'totales'])
+
+def _totales_vacios():
+    return {'lineas': 0, 'unidades': 0, 'subtotal_centavos': 0}
+
+def _mismo_producto(linea, item):
+    # Con otro precio (el catálogo cambió entre dos agregados) va en una línea aparte
+    return linea['producto'] == item['producto'] and linea['precio'] == item['precio']
+
+class _CarritoEnMemoria:
+    __slots__ = ('items', 'totales')
+
+    def __init__(self):
+        self.items = []
+        self.totales = _totales_vacios()
+
+    def linea(self, linea_id):
+        for linea in self.items:
+            if linea['id'] == linea_id:
+                return linea
+        return None
+
+    def sumar(self, lineas=0, unidades=0, centavos=0):
+        self.totales['lineas'] += lineas
+        self.totales['unidades'] += unidades
+        self.totales['subtotal_centavos'] += centavos
+        return dict(self.totales)
+
+class CarritoMemoria:
+    """Carritos en un dict del proceso, descartados después de `ttl` segundos sin uso"""
+
+    def __init__(self, ttl=3600, intervalo_purga=60):
+        self.ttl = ttl
+        self.intervalo_purga = intervalo_purga
+        self._carritos = {}
+        self._lock = threading.Lock()
+        self._ultima_purga = time.monotonic()
+        # Ids únicos en todo el almacén: un carrito vaciado no vuelve a repartir los mismos
+        self._ids = count(1)
+
+    def _purgar(self, ahora):
+        if ahora - self._ultima_purga < self.intervalo_purga:
+            return
+        vencidos = [cid for cid, (expira, _) in self._carritos.items() if expira <= ahora]
+        for cid in vencidos:
+            del self._carritos[cid]
+        self._ultima_purga = ahora
+        if vencidos:
+            logger.info(f"🧹 {len(vencidos)} carritos vencidos descartados")
+
+    def _carrito(self, carrito_id):
+        ahora = time.monotonic()
+        self._purgar(ahora)
+        entrada = self._carritos.get(carrito_id)
+        carrito = entrada[1] if entrada and entrada[0] > ahora else _CarritoEnMemoria()
+        self._carritos[carrito_id] = (ahora + self.ttl, carrito)
+        return carrito
+
+    def obtener(self, carrito_id):
+        with self._lock:
+            return [dict(i) for i in self._carrito(carrito_id).items]
+
+    def totales(self, carrito_id):
+        with self._lock:
+            return dict(self._carrito(carrito_id).totales)
+
+    def agregar(self, carrito_id, item):
+        """Suma el item a la línea del mismo producto, o lo agrega al final"""
+        with self._lock:
+            carrito = self._carrito(carrito_id)
+            for linea in carrito.items:
+                if _mismo_producto(linea, item):
+                    linea['cantidad'] += item['cantidad']
+                    linea['subtotal'] = a_pesos(subtotal_linea(linea['precio'], linea['cantidad']))
+                    totales = carrito.sumar(unidades=item['cantidad'], centavos=subtotal_linea(item['precio'], item['cantidad']))
+                    return CambioCarrito(linea['id'], dict(linea), totales)
+
+            linea = {**item, 'id': next(self._ids)}
+            carrito.items.append(linea)
+            totales = carrito.sumar(lineas=1, unidades=item['cantidad'], centavos=subtotal_linea(item['precio'], item['cantidad']))
+            return CambioCarrito(linea['id'], dict(linea), totales)
+
+    def actualizar(self, carrito_id, linea_id, cantidad):
+        """Fija la cantidad de una línea; None si la línea no existe"""
+        with self._lock:
+            carrito = self._carrito(carrito_id)
+            linea = carrito.linea(linea_id)
+            if linea is None:
+                return None
+            diferencia = cantidad - linea['cantidad']
+            totales = carrito.sumar(unidades=diferencia, centavos=subtotal_linea(linea['precio'], diferencia))
+            linea['cantidad'] = cantidad
+            linea['subtotal'] = a_pesos(subtotal_linea(linea['precio'], cantidad))
+            return CambioCarrito(linea_id, dict(linea), totales)
+
+    def eliminar(self, carrito_id, linea_id):
+        """Quita una línea; None si la línea no existe"""
+        with self._lock:
+            carrito = self._carrito(carrito_id)
+            linea = carrito.linea(linea_id)
+            if linea is None:
+                return None
+            carrito.items.remove(linea)
+            totales = carrito.sumar(lineas=-1, unidades=-linea['cantidad'], centavos=-subtotal_linea(linea['precio'], linea['cantidad']))
+            return CambioCarrito(linea_id, None, totales)
+
+    def quitar(self, carrito_id, linea_ids):
+        """Quita las líneas con esos ids, si siguen en el carrito; devuelve los totales"""
+        with self._lock:
+            carrito = self._carrito(carrito_id)
+            quitar = set(linea_ids)
+            for linea in [l for l in carrito.items if l['id'] in quitar]:
+                carrito.items.remove(linea)
+                carrito.sumar(lineas=-1, unidades=-linea['cantidad'], centavos=-subtotal_linea(linea['precio'], linea['cantidad']))
+            return dict(carrito.totales)
+
+    def vaciar(self, carrito_id):
+        with self._lock:
+            self._carritos.pop(carrito_id, None)
+
+class CarritoBD:
+    """Carritos en la tabla carrito_items, compartidos entre workers y funciones serverless.
+
+    Los totales viven en la fila de `carritos` y se actualizan con sumas atómicas
+    en la misma transacción que la línea, sin recorrer los items. Cabecera y
+    líneas se escriben con INSERT ... ON CONFLICT: dos agregados simultáneos del
+    mismo producto suman sobre una sola línea en lugar de fallar o duplicarla.
+    """
+
+    def __init__(self, ttl=3600, intervalo_purga=300):
+        self.ttl = ttl
+        self.intervalo_purga = intervalo_purga
+        self._ultima_purga = 0.0
+
+    def _purgar(self):
+        ahora = time.monotonic()
+        if ahora - self._ultima_purga < self.intervalo_purga:
+            return
+        self._ultima_purga = ahora
+        limite = datetime.utcnow() - timedelta(seconds=self.ttl)
+        vencidos = db.select(Carrito.carrito_id).where(Carrito.updated_at < limite)
+        borrados = CarritoItem.query.filter(CarritoItem.carrito_id.in_(vencidos)).delete(synchronize_session=False)
+        Carrito.query.filter(Carrito.updated_at < limite).delete(synchronize_session=False)
+        if borrados:
+            logger.info(f"🧹 {borrados} líneas de carritos vencidos borradas")
+
+    def _sumar(self, carrito_id, lineas=0, unidades=0, centavos=0):
+        insert = insert_con_upsert()
+        if insert is not None:
+            tabla = Carrito.__table__
+            stmt = insert(tabla).values(
+                carrito_id=carrito_id,
+                lineas=lineas,
+                unidades=unidades,
+                subtotal_centavos=centavos,
+                updated_at=datetime.utcnow()
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['carrito_id'],
+                set_={
+                    'lineas': tabla.c.lineas + stmt.excluded.lineas,
+                    'unidades': tabla.c.unidades + stmt.excluded.unidades,
+                    'subtotal_centavos': tabla.c.subtotal_centavos + stmt.excluded.subtotal_centavos,
+                    'updated_at': stmt.excluded.updated_at
+                }
+            )
+            db.session.execute(stmt)
+            return
+
+        carrito = Carrito.query.filter_by(carrito_id=carrito_id).with_for_update().first()
+        if not carrito:
+            carrito = Carrito(carrito_id=carrito_id, lineas=0, unidades=0, subtotal_centavos=0)
+            db.session.add(carrito)
+        carrito.lineas += lineas
+        carrito.unidades += unidades
+        carrito.subtotal_centavos += centavos
+
+    def _sumar_linea(self, carrito_id, item):
+        """Suma el item a la línea del mismo producto y precio o la crea; devuelve (id, cantidad final)"""
+        insert = insert_con_upsert()
+        if insert is not None:
+            tabla = CarritoItem.__table__
+            stmt = insert(tabla).values(
+                carrito_id=carrito_id,
+                producto=item['producto'],
+                cantidad=item['cantidad'],
+                precio=item['precio'],
+                subtotal=item['subtotal'],
+                proveedor=item.get('proveedor'),
+                categoria=item.get('categoria'),
+                created_at=datetime.utcnow()
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['carrito_id', 'producto', 'precio'],
+                set_={
+                    'cantidad': tabla.c.cantidad + stmt.excluded.cantidad,
+                    # El subtotal se recalcula en la misma sentencia, sobre la cantidad que quedó
+                    'subtotal': (tabla.c.cantidad + stmt.excluded.cantidad) * a_centavos(item['precio']) / 100.0
+                }
+            ).returning(tabla.c.id, tabla.c.cantidad)
+            return tuple(db.session.execute(stmt).one())
+
+        fila = CarritoItem.query.filter_by(
+            carrito_id=carrito_id, producto=item['producto'], precio=item['precio']
+        ).with_for_update().first()
+        if fila:
+            fila.cantidad += item['cantidad']
+            fila.subtotal = a_pesos(subtotal_linea(fila.precio, fila.cantidad))
+        else:
+            fila = CarritoItem(
+                carrito_id=carrito_id,
+                producto=item['producto'],
+                cantidad=item['cantidad'],
+                precio=item['precio'],
+                subtotal=item['subtotal'],
+                proveedor=item.get('proveedor'),
+                categoria=item.get('categoria')
+            )
+            db.session.add(fila)
+        db.session.flush()
+        return fila.id, fila.cantidad
+
+    def _cambiar_linea(self, carrito_id, linea_id, cambio):
+        """Aplica `cambio(consulta, anterior)` a la línea; devuelve la cantidad y el precio que tenía, o None si no existe"""
+        while True:
+            anterior = db.session.query(CarritoItem.cantidad, CarritoItem.precio).filter_by(
+                carrito_id=carrito_id, id=linea_id
+            ).with_for_update().first()
+            if anterior is None:
+                return None
+            # with_for_update bloquea la línea en PostgreSQL; SQLite lo ignora, así que la escritura
+            # además exige que la cantidad siga siendo la leída y, si otro la cambió, se vuelve a leer
+            consulta = CarritoItem.query.filter_by(id=linea_id, cantidad=anterior.cantidad)
+            if cambio(consulta, anterior):
+                return anterior
+
+    def obtener(self, carrito_id):
+        items = CarritoItem.query.filter_by(carrito_id=carrito_id).order_by(CarritoItem.id).all()
+        return [i.to_dict() for i in items]
+
+    def totales(self, carrito_id):
+        fila = db.session.query(Carrito.lineas, Carrito.unidades, Carrito.subtotal_centavos).filter(
+            Carrito.carrito_id == carrito_id
+        ).first()
+        if fila is None:
+            return _totales_vacios()
+        return {'lineas': fila.lineas, 'unidades': fila.unidades, 'subtotal_centavos': fila.subtotal_centavos}
+
+    def _confirmar(self, carrito_id, linea_id):
+        db.session.commit()
+        fila = db.session.get(CarritoItem, linea_id, populate_existing=True)
+        return CambioCarrito(linea_id, fila.to_dict() if fila else None, self.totales(carrito_id))
+
+    def agregar(self, carrito_id, item):
+        """Suma el item a la línea del mismo producto, o lo agrega al final"""
+        try:
+            self._purgar()
+            linea_id, cantidad = self._sumar_linea(carrito_id, item)
+            # Las cantidades siempre son positivas: si quedó la del item, la línea es nueva
+            nueva = cantidad == item['cantidad']
+            self._sumar(carrito_id, lineas=int(nueva), unidades=item['cantidad'], centavos=subtotal_linea(item['precio'], item['cantidad']))
+            return self._confirmar(carrito_id, linea_id)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def actualizar(self, carrito_id, linea_id, cantidad):
+        """Fija la cantidad de una línea; None si la línea no existe"""
+        try:
+            anterior = self._cambiar_linea(carrito_id, linea_id, lambda consulta, anterior: consulta.update(
+                {
+                    CarritoItem.cantidad: cantidad,
+                    CarritoItem.subtotal: a_pesos(subtotal_linea(anterior.precio, cantidad))
+                },
+                synchronize_session=False
+            ))
+            if anterior is None:
+                return None
+            diferencia = cantidad - anterior.cantidad
+            self._sumar(carrito_id, unidades=diferencia, centavos=subtotal_linea(anterior.precio, diferencia))
+            return self._confirmar(carrito_id, linea_id)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def eliminar(self, carrito_id, linea_id):
+        """Quita una línea; None si la línea no existe"""
+        try:
+            anterior = self._cambiar_linea(
+                carrito_id, linea_id, lambda consulta, anterior: consulta.delete(synchronize_session=False)
+            )
+            if anterior is None:
+                return None
+            self._sumar(carrito_id, lineas=-1, unidades=-anterior.cantidad, centavos=-subtotal_linea(anterior.precio, anterior.cantidad))
+            return self._confirmar(carrito_id, linea_id)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def quitar(self, carrito_id, linea_ids):
+        """Quita las líneas con esos ids, si siguen en el carrito; devuelve los totales"""
+        try:
+            for linea_id in linea_ids:
+                anterior = self._cambiar_linea(
+                    carrito_id, linea_id, lambda consulta, anterior: consulta.delete(synchronize_session=False)
+                )
+                if anterior is not None:
+                    self._sumar(carrito_id, lineas=-1, unidades=-anterior.cantidad, centavos=-subtotal_linea(anterior.precio, anterior.cantidad))
+            db.session.commit()
+            return self.totales(carrito_id)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def vaciar(self, carrito_id):
+        try:
+            CarritoItem.query.filter_by(carrito_id=carrito_id).delete(synchronize_session=False)
+            Carrito.query.filter_by(carrito_id=carrito_id).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+BACKENDS = {
+    'memoria': CarritoMemoria,
+    'bd': CarritoBD
+}
+
+def crear_almacen_carritos(backend, ttl=3600):
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de carritos desconocido: {backend}")
+    logger.info(f"🛒 Carritos en backend '{backend}'")
+    return BACKENDS[backend](ttl=ttl)
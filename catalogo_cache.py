@@ -0,0 +1,57 @@
+from collections import namedtuple
+from datetime import datetime
+import logging
+import threading
+
+from models import db, Producto, CatalogoVersion
+
+logger = logging.getLogger(__name__)
+
+ProductoCatalogo = namedtuple('ProductoCatalogo', ['id', 'nombre', 'categoria', 'subcategoria', 'precio_venta', 'proveedor'])
+Catalogo = namedtuple('Catalogo', ['version', 'productos', 'categorias'])
+
+_lock = threading.Lock()
+_catalogo = None
+
+def version_catalogo():
+    """Versión vigente del catálogo, compartida por todos los workers a través de la BD"""
+    version = db.session.query(CatalogoVersion.version).filter(CatalogoVersion.id == 1).scalar()
+    return version or 0
+
+def invalidar_catalogo():
+    """Incrementa la versión del catálogo (sin commit, va en la transacción de la modificación)"""
+    actualizados = db.session.query(CatalogoVersion).filter(CatalogoVersion.id == 1).update(
+        {CatalogoVersion.version: CatalogoVersion.version + 1, CatalogoVersion.updated_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    if not actualizados:
+        db.session.add(CatalogoVersion(id=1, version=1))
+
+def _cargar_catalogo(version):
+    filas = db.session.query(
+        Producto.id,
+        Producto.nombre,
+        Producto.categoria,
+        Producto.subcategoria,
+        Producto.precio_venta,
+        Producto.proveedor
+    ).filter(Producto.estado == 'Disponible').order_by(Producto.id).all()
+
+    productos = tuple(ProductoCatalogo(*fila) for fila in filas)
+    categorias = tuple(dict.fromkeys(p.categoria for p in productos if p.categoria))
+    return Catalogo(version, productos, categorias)
+
+def obtener_catalogo():
+    """Snapshot de productos disponibles, recargado solo cuando cambia la versión"""
+    global _catalogo
+
+    version = version_catalogo()
+    catalogo = _catalogo
+    if catalogo is not None and catalogo.version == version:
+        return catalogo
+
+    with _lock:
+        if _catalogo is None or _catalogo.version != version:
+            _catalogo = _cargar_catalogo(version)
+            logger.info(f"📦 Catálogo v{version} cargado en memoria: {len(_catalogo.productos)} productos")
+        return _catalogo
@@ -0,0 +1,58 @@
+"""Fixtures de pytest: cada test usa su propia base SQLite y una app recién importada"""
+import importlib
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import analitica
+import busqueda
+import catalogo_cache
+import terminales
+import ventas
+
+def _olvidar_estado_de_proceso():
+    """Cachés de módulo que sobreviven entre apps: una base nueva puede repetir sus versiones"""
+    catalogo_cache._catalogo = None
+    busqueda.indice_productos.version = None
+    terminales.invalidar_registro()
+    analitica.limpiar_cache()
+    ventas.claves_recientes._entradas.clear()
+    ventas.claves_recientes._en_curso.clear()
+
+@pytest.fixture
+def nueva_app(tmp_path, monkeypatch):
+    """Fábrica: importa app.py contra una base en tmp_path con las variables de entorno dadas"""
+    cargadas = []
+
+    def crear(**entorno):
+        monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / f'pocopan{len(cargadas)}.db'}")
+        monkeypatch.setenv('CARRITO_BACKEND', 'memoria')
+        for nombre, valor in entorno.items():
+            monkeypatch.setenv(nombre, valor)
+        _olvidar_estado_de_proceso()
+
+        modulo = importlib.reload(sys.modules['app']) if 'app' in sys.modules else importlib.import_module('app')
+        modulo.init_db()
+        cargadas.append(modulo)
+        return modulo
+
+    yield crear
+
+    for modulo in cargadas:
+        with modulo.app.app_context():
+            modulo.db.session.remove()
+            modulo.db.engine.dispose()
+        # Metricas escucha en la clase Engine: cada app importada suma sus listeners
+        event.remove(Engine, 'before_cursor_execute', modulo.metricas._antes_sql)
+        event.remove(Engine, 'after_cursor_execute', modulo.metricas._despues_sql)
+    _olvidar_estado_de_proceso()
+
+@pytest.fixture
+def aplicacion(nueva_app):
+    """El módulo app con una base nueva y carritos en memoria"""
+    return nueva_app()
@@ -0,0 +1,51 @@
+import logging
+import os
+
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+PERFILES = ('local', 'serverless', 'servidor')
+
+def perfil_despliegue():
+    """Perfil de PERFIL_DESPLIEGUE, o deducido del entorno: Vercel, Postgres propio o local"""
+    perfil = os.getenv('PERFIL_DESPLIEGUE')
+    if perfil:
+        if perfil not in PERFILES:
+            raise ValueError(f"PERFIL_DESPLIEGUE debe ser uno de {', '.join(PERFILES)}")
+        return perfil
+    if os.getenv('VERCEL'):
+        return 'serverless'
+    if os.getenv('DATABASE_URL'):
+        return 'servidor'
+    return 'local'
+
+def opciones_motor(perfil, database_url):
+    """SQLALCHEMY_ENGINE_OPTIONS para cada perfil.
+
+    - serverless: cada invocación puede ser un proceso nuevo y congelarse entre
+      requests, así que no se guardan conexiones (NullPool). Si hay que reutilizar
+      conexiones, DATABASE_URL debe apuntar a un pooler externo (PgBouncer,
+      pooler de Supabase/Neon) que es quien mantiene el pool.
+    - servidor: workers de gunicorn de larga vida con un QueuePool por proceso,
+      dimensionado con DB_POOL_SIZE/DB_MAX_OVERFLOW según los threads del worker.
+    - local: los valores por defecto de SQLAlchemy.
+    """
+    if database_url.startswith('sqlite'):
+        return {}
+
+    opciones = {'connect_args': {'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5'))}}
+    if perfil == 'serverless':
+        opciones['poolclass'] = NullPool
+    elif perfil == 'servidor':
+        opciones.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', '5')),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '5')),
+            pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', '10')),
+            pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+            pool_pre_ping=True,
+            pool_use_lifo=True
+        )
+    else:
+        opciones['pool_pre_ping'] = True
+    return opciones
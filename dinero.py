@@ -0,0 +1,45 @@
+from decimal import Decimal, ROUND_HALF_UP
+import os
+
+# Alícuota de IVA en porcentaje; CONFIG['iva'] y todos los tickets la toman de acá
+PORCENTAJE_IVA = Decimal(os.getenv('PORCENTAJE_IVA', '21'))
+
+_CENTAVOS_POR_PESO = Decimal(100)
+_UNIDAD = Decimal(1)
+
+def a_centavos(monto):
+    """Monto en pesos (float, str o Decimal) a centavos enteros, redondeando al centavo más cercano"""
+    if monto is None:
+        return 0
+    return int((Decimal(str(monto)) * _CENTAVOS_POR_PESO).quantize(_UNIDAD, rounding=ROUND_HALF_UP))
+
+def a_pesos(centavos):
+    """Centavos a pesos con dos decimales, como float para JSON y plantillas"""
+    return float(Decimal(int(centavos or 0)) / _CENTAVOS_POR_PESO)
+
+def subtotal_linea(precio, cantidad):
+    """Importe de una línea en centavos: el precio se redondea al centavo antes de multiplicar"""
+    return a_centavos(precio) * int(cantidad)
+
+def iva_centavos(subtotal_centavos, porcentaje=PORCENTAJE_IVA):
+    return int((Decimal(subtotal_centavos) * Decimal(porcentaje) / 100).quantize(_UNIDAD, rounding=ROUND_HALF_UP))
+
+def totales_ticket(subtotal_centavos, porcentaje=PORCENTAJE_IVA):
+    """Subtotal, IVA y total en centavos; el IVA se calcula una sola vez sobre el subtotal del ticket"""
+    iva = iva_centavos(subtotal_centavos, porcentaje)
+    return {
+        'subtotal_centavos': subtotal_centavos,
+        'iva_centavos': iva,
+        'total_centavos': subtotal_centavos + iva,
+        'porcentaje_iva': Decimal(porcentaje)
+    }
+
+def totales_en_pesos(totales):
+    """Los totales de `totales_ticket` como los muestran el POS y los resúmenes de venta"""
+    porcentaje = totales['porcentaje_iva']
+    return {
+        'subtotal': a_pesos(totales['subtotal_centavos']),
+        'iva': a_pesos(totales['iva_centavos']),
+        'total': a_pesos(totales['total_centavos']),
+        'porcentaje_iva': int(porcentaje) if porcentaje == int(porcentaje) else float(porcentaje)
+    }
@@ -0,0 +1,105 @@
+import csv
+import io
+import logging
+import os
+import tempfile
+
+from models import db, Ticket, LineaVenta
+from archivo import iterar_archivo
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS_VENTAS = [
+    'ID_Venta', 'Fecha', 'Hora', 'ID_Cliente', 'Producto',
+    'Cantidad', 'Precio_Unitario', 'Total_Venta', 'Vendedor', 'ID_Terminal'
+]
+
+FILAS_POR_LOTE = 2000
+TAMANO_BLOQUE_ARCHIVO = 64 * 1024
+
+def consulta_ventas(desde=None, hasta=None, terminal=None):
+    """Una fila por línea con los datos de su ticket; los importes en pesos, como en el archivo"""
+    consulta = db.select(
+        Ticket.id_venta,
+        Ticket.fecha,
+        Ticket.hora,
+        Ticket.id_cliente,
+        LineaVenta.producto_nombre,
+        LineaVenta.cantidad,
+        (LineaVenta.precio_centavos / 100.0).label('precio_unitario'),
+        (LineaVenta.precio_centavos * LineaVenta.cantidad / 100.0).label('total_venta'),
+        Ticket.vendedor,
+        Ticket.id_terminal
+    ).select_from(LineaVenta).join(Ticket, LineaVenta.ticket_id == Ticket.id)
+    if desde:
+        consulta = consulta.where(Ticket.fecha >= desde)
+    if hasta:
+        consulta = consulta.where(Ticket.fecha <= hasta)
+    if terminal:
+        consulta = consulta.where(Ticket.id_terminal == terminal)
+    return consulta.order_by(Ticket.fecha, LineaVenta.id)
+
+def iterar_ventas(desde=None, hasta=None, terminal=None):
+    """Filas del archivo Parquet y luego de las tablas de tickets (con cursor del servidor), por lotes"""
+    yield from iterar_archivo(desde, hasta, terminal)
+
+    resultado = db.session.execute(
+        consulta_ventas(desde, hasta, terminal).execution_options(yield_per=FILAS_POR_LOTE)
+    )
+    for lote in resultado.partitions():
+        yield lote
+
+def generar_csv(desde=None, hasta=None, terminal=None):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+
+    escritor.writerow(COLUMNAS_VENTAS)
+    total = 0
+    for lote in iterar_ventas(desde, hasta, terminal):
+        escritor.writerows(
+            (f.id_venta, f.fecha, f.hora, f.id_cliente, f.producto_nombre, f.cantidad,
+             f.precio_unitario, f.total_venta, f.vendedor, f.id_terminal)
+            for f in lote
+        )
+        total += len(lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+    logger.info(f"📤 Exportación CSV: {total} filas")
+
+def generar_xlsx(desde=None, hasta=None, terminal=None):
+    from openpyxl import Workbook
+
+    # Modo write-only: openpyxl vuelca las filas a disco a medida que se agregan
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Ventas')
+    hoja.append(COLUMNAS_VENTAS)
+
+    total = 0
+    for lote in iterar_ventas(desde, hasta, terminal):
+        for f in lote:
+            hoja.append([f.id_venta, f.fecha, str(f.hora), f.id_cliente, f.producto_nombre, f.cantidad,
+                         f.precio_unitario, f.total_venta, f.vendedor, f.id_terminal])
+        total += len(lote)
+
+    descriptor, ruta = tempfile.mkstemp(suffix='.xlsx')
+    os.close(descriptor)
+    try:
+        libro.save(ruta)
+        logger.info(f"📤 Exportación XLSX: {total} filas")
+        with open(ruta, 'rb') as archivo:
+            while True:
+                bloque = archivo.read(TAMANO_BLOQUE_ARCHIVO)
+                if not bloque:
+                    break
+                yield bloque
+    finally:
+        os.remove(ruta)
+
+FORMATOS = {
+    'csv': (generar_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (generar_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+}
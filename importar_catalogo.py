@@ -0,0 +1,159 @@
+from datetime import datetime
+import logging
+import os
+
+import pandas as pd
+
+from models import db, Producto, normalizar_nombre
+from catalogo_cache import invalidar_catalogo
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS = {
+    'Nombre': 'nombre',
+    'Categoria': 'categoria',
+    'SubCAT': 'subcategoria',
+    'Precio Venta': 'precio_venta',
+    'Proveedor': 'proveedor',
+    'Estado': 'estado'
+}
+CAMPOS = ['nombre', 'categoria', 'subcategoria', 'precio_venta', 'proveedor', 'estado']
+ESTADO_INACTIVO = 'No Disponible'
+LOTE_IDS = 500
+
+def leer_catalogo(archivo, nombre_archivo=None):
+    """Lee un catálogo .xlsx o .csv con las columnas de catalogo.xlsx"""
+    extension = os.path.splitext(nombre_archivo or str(archivo))[1].lower()
+    if extension == '.csv':
+        df = pd.read_csv(archivo, dtype=str)
+    else:
+        df = pd.read_excel(archivo, dtype=str)
+    df = df.rename(columns=lambda c: COLUMNAS.get(str(c).strip(), str(c).strip()))
+    if 'nombre' not in df.columns or 'precio_venta' not in df.columns:
+        raise ValueError("El catálogo debe tener las columnas 'Nombre' y 'Precio Venta'")
+    return df
+
+def _texto(serie, defecto):
+    serie = serie.fillna('').astype(str).str.strip()
+    return serie.where(serie != '', defecto)
+
+def normalizar_catalogo(df):
+    """Limpia el catálogo igual que agregar_producto y descarta filas inválidas o repetidas"""
+    presentes = [c for c in CAMPOS if c in df.columns]
+    for columna in CAMPOS:
+        if columna not in df.columns:
+            df[columna] = None
+
+    limpio = pd.DataFrame({
+        'nombre': df['nombre'].fillna('').astype(str).str.replace(r'\s+', ' ', regex=True).str.strip(),
+        'categoria': _texto(df['categoria'], 'Sin Categoría'),
+        'subcategoria': _texto(df['subcategoria'], ''),
+        'precio_venta': pd.to_numeric(df['precio_venta'], errors='coerce'),
+        'proveedor': _texto(df['proveedor'], 'Sin Proveedor'),
+        'estado': _texto(df['estado'], 'Disponible')
+    })
+    limpio['clave'] = limpio['nombre'].map(normalizar_nombre)
+
+    validas = (limpio['nombre'] != '') & (limpio['precio_venta'] > 0)
+    rechazadas = int((~validas).sum())
+    limpio = limpio[validas]
+
+    repetidas = int(limpio['clave'].duplicated(keep='last').sum())
+    limpio = limpio.drop_duplicates('clave', keep='last')
+
+    return limpio, presentes, {'rechazadas': rechazadas, 'repetidas': repetidas}
+
+def _productos_actuales():
+    filas = db.session.query(
+        Producto.id,
+        Producto.nombre,
+        Producto.categoria,
+        Producto.subcategoria,
+        Producto.precio_venta,
+        Producto.proveedor,
+        Producto.estado,
+        Producto.nombre_normalizado
+    ).all()
+    actuales = pd.DataFrame(filas, columns=['id'] + CAMPOS + ['clave'])
+    return actuales.drop_duplicates('clave')
+
+def calcular_diferencias(nuevo, actuales, campos=CAMPOS, desactivar_faltantes=True):
+    """Separa el catálogo en altas, modificaciones y bajas comparando por nombre sin mayúsculas.
+
+    Solo se comparan y actualizan los `campos` que trae el archivo; un catálogo
+    sin columna Proveedor no pisa los proveedores cargados. Sin columna Estado,
+    los productos dados de baja que vuelven a figurar en el archivo se reactivan.
+    """
+    cruce = nuevo.merge(actuales, on='clave', how='outer', suffixes=('', '_actual'), indicator=True)
+
+    altas = cruce[cruce['_merge'] == 'left_only'][CAMPOS]
+
+    ambos = cruce[cruce['_merge'] == 'both'].copy()
+    if 'estado' not in campos:
+        inactivo = ambos['estado_actual'] == ESTADO_INACTIVO
+        ambos['estado'] = ambos['estado_actual'].where(~inactivo, 'Disponible')
+        campos = campos + ['estado']
+    distinto = pd.Series(False, index=ambos.index)
+    for campo in campos:
+        if campo == 'precio_venta':
+            distinto |= (ambos[campo] - ambos[f'{campo}_actual']).abs() > 1e-9
+        else:
+            distinto |= ambos[campo].fillna('') != ambos[f'{campo}_actual'].fillna('')
+    modificaciones = ambos[distinto][['id'] + campos]
+
+    if desactivar_faltantes:
+        faltantes = cruce[(cruce['_merge'] == 'right_only') & (cruce['estado_actual'] != ESTADO_INACTIVO)]
+        bajas = faltantes['id']
+    else:
+        bajas = pd.Series([], dtype='int64')
+
+    return altas, modificaciones, bajas
+
+def _registros(df):
+    registros = df.astype(object).where(df.notna(), None).to_dict('records')
+    ahora = datetime.utcnow()
+    for registro in registros:
+        registro['updated_at'] = ahora
+        if 'nombre' in registro:
+            registro['nombre_normalizado'] = normalizar_nombre(registro['nombre'])
+    return registros
+
+def importar_catalogo(archivo, nombre_archivo=None, desactivar_faltantes=True, simular=False):
+    """Aplica un catálogo completo a la tabla productos en una sola transacción"""
+    nuevo, presentes, descartes = normalizar_catalogo(leer_catalogo(archivo, nombre_archivo))
+    altas, modificaciones, bajas = calcular_diferencias(nuevo, _productos_actuales(), presentes, desactivar_faltantes)
+
+    resumen = {
+        'filas': len(nuevo),
+        'altas': len(altas),
+        'modificaciones': len(modificaciones),
+        'bajas': len(bajas),
+        **descartes
+    }
+    if simular:
+        return resumen
+
+    try:
+        if len(altas):
+            db.session.execute(db.insert(Producto), _registros(altas))
+        if len(modificaciones):
+            registros = _registros(modificaciones)
+            for registro in registros:
+                registro['id'] = int(registro['id'])
+            db.session.execute(db.update(Producto), registros)
+        ids_bajas = [int(i) for i in bajas]
+        for inicio in range(0, len(ids_bajas), LOTE_IDS):
+            db.session.execute(
+                db.update(Producto)
+                .where(Producto.id.in_(ids_bajas[inicio:inicio + LOTE_IDS]))
+                .values(estado=ESTADO_INACTIVO, updated_at=datetime.utcnow())
+            )
+        if altas.size or modificaciones.size or ids_bajas:
+            invalidar_catalogo()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"✅ Catálogo importado: {resumen}")
+    return resumen
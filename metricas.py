@@ -0,0 +1,177 @@
+from collections import defaultdict, deque
+import logging
+import threading
+import time
+
+from flask import Response, g, has_request_context, request, session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CUANTILES = (0.5, 0.95, 0.99)
+
+def _percentil(ordenados, q):
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+def _etiquetas(**valores):
+    partes = []
+    for clave, valor in valores.items():
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{clave}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+class _Serie:
+    def __init__(self, ventana):
+        self.buckets = [0] * len(BUCKETS)
+        self.cantidad = 0
+        self.suma = 0.0
+        self.recientes = deque(maxlen=ventana)
+
+    def observar(self, valor):
+        self.cantidad += 1
+        self.suma += valor
+        self.recientes.append(valor)
+        for i, limite in enumerate(BUCKETS):
+            if valor <= limite:
+                self.buckets[i] += 1
+
+class Metricas:
+    """Tiempos por request y por sentencia SQL, expuestos en formato Prometheus.
+
+    Por cada endpoint y terminal se guarda un histograma acumulado y una
+    ventana de las últimas `ventana` duraciones para calcular p50/p95/p99.
+    """
+
+    def __init__(self, app=None, ventana=1024):
+        self.ventana = ventana
+        self._lock = threading.Lock()
+        self._requests = defaultdict(lambda: _Serie(self.ventana))
+        self._respuestas = defaultdict(int)
+        self._sql_cantidad = defaultdict(int)
+        self._sql_segundos = defaultdict(float)
+        self._sql_lentas = defaultdict(int)
+        self._n_mas_1 = defaultdict(int)
+        self.sql_lento_ms = 200
+        self.umbral_n_mas_1 = 10
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sql_lento_ms = app.config.get('METRICAS_SQL_LENTO_MS', self.sql_lento_ms)
+        self.umbral_n_mas_1 = app.config.get('METRICAS_UMBRAL_N_MAS_1', self.umbral_n_mas_1)
+
+        app.before_request(self._inicio_request)
+        app.after_request(self._fin_request)
+        event.listen(Engine, 'before_cursor_execute', self._antes_sql)
+        event.listen(Engine, 'after_cursor_execute', self._despues_sql)
+
+    def _inicio_request(self):
+        g.metricas_inicio = time.perf_counter()
+        g.metricas_sql = 0
+        g.metricas_sql_segundos = 0.0
+        g.metricas_sentencias = defaultdict(int)
+
+    def _antes_sql(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metricas_inicio_sql', []).append(time.perf_counter())
+
+    def _despues_sql(self, conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get('metricas_inicio_sql')
+        if not inicios:
+            return
+        duracion = time.perf_counter() - inicios.pop()
+
+        if duracion * 1000 >= self.sql_lento_ms:
+            endpoint = request.endpoint if has_request_context() else None
+            logger.warning(f"🐢 SQL lento ({duracion * 1000:.0f} ms) en {endpoint or 'fuera de request'}: {statement[:200]}")
+            with self._lock:
+                self._sql_lentas[endpoint or '-'] += 1
+
+        if not has_request_context() or 'metricas_inicio' not in g:
+            return
+        g.metricas_sql += 1
+        g.metricas_sql_segundos += duracion
+        g.metricas_sentencias[statement] += 1
+        if g.metricas_sentencias[statement] == self.umbral_n_mas_1:
+            logger.warning(f"🔁 Posible N+1 en {request.endpoint}: la misma sentencia se ejecutó {self.umbral_n_mas_1} veces: {statement[:200]}")
+            with self._lock:
+                self._n_mas_1[request.endpoint or '-'] += 1
+
+    def _fin_request(self, respuesta):
+        if 'metricas_inicio' not in g:
+            return respuesta
+        duracion = time.perf_counter() - g.metricas_inicio
+        endpoint = request.endpoint or 'desconocido'
+        terminal = session.get('terminal') or '-'
+
+        with self._lock:
+            self._requests[(endpoint, terminal)].observar(duracion)
+            self._respuestas[(endpoint, terminal, respuesta.status_code)] += 1
+            self._sql_cantidad[endpoint] += g.metricas_sql
+            self._sql_segundos[endpoint] += g.metricas_sql_segundos
+
+        respuesta.headers['Server-Timing'] = f'app;dur={duracion * 1000:.1f}, sql;dur={g.metricas_sql_segundos * 1000:.1f}'
+        return respuesta
+
+    def resumen(self):
+        """Percentiles de la ventana reciente por endpoint y terminal"""
+        with self._lock:
+            series = {clave: sorted(serie.recientes) for clave, serie in self._requests.items()}
+        return {
+            clave: {f'p{int(q * 100)}': _percentil(valores, q) for q in CUANTILES}
+            for clave, valores in series.items() if valores
+        }
+
+    def texto_prometheus(self):
+        lineas = []
+        with self._lock:
+            lineas.append('# HELP pocopan_request_duration_seconds Duración de requests por endpoint y terminal')
+            lineas.append('# TYPE pocopan_request_duration_seconds histogram')
+            for (endpoint, terminal), serie in sorted(self._requests.items()):
+                for limite, acumulado in zip(BUCKETS, serie.buckets):
+                    lineas.append(f'pocopan_request_duration_seconds_bucket{_etiquetas(endpoint=endpoint, terminal=terminal, le=limite)} {acumulado}')
+                lineas.append(f'pocopan_request_duration_seconds_bucket{_etiquetas(endpoint=endpoint, terminal=terminal, le="+Inf")} {serie.cantidad}')
+                lineas.append(f'pocopan_request_duration_seconds_sum{_etiquetas(endpoint=endpoint, terminal=terminal)} {serie.suma}')
+                lineas.append(f'pocopan_request_duration_seconds_count{_etiquetas(endpoint=endpoint, terminal=terminal)} {serie.cantidad}')
+
+            lineas.append('# HELP pocopan_request_latency_seconds Percentiles de las últimas requests por endpoint y terminal')
+            lineas.append('# TYPE pocopan_request_latency_seconds summary')
+            for (endpoint, terminal), serie in sorted(self._requests.items()):
+                recientes = sorted(serie.recientes)
+                if not recientes:
+                    continue
+                for q in CUANTILES:
+                    lineas.append(f'pocopan_request_latency_seconds{_etiquetas(endpoint=endpoint, terminal=terminal, quantile=q)} {_percentil(recientes, q)}')
+                lineas.append(f'pocopan_request_latency_seconds_sum{_etiquetas(endpoint=endpoint, terminal=terminal)} {serie.suma}')
+                lineas.append(f'pocopan_request_latency_seconds_count{_etiquetas(endpoint=endpoint, terminal=terminal)} {serie.cantidad}')
+
+            lineas.append('# HELP pocopan_requests_total Requests atendidas por endpoint, terminal y código HTTP')
+            lineas.append('# TYPE pocopan_requests_total counter')
+            for (endpoint, terminal, estado), cantidad in sorted(self._respuestas.items()):
+                lineas.append(f'pocopan_requests_total{_etiquetas(endpoint=endpoint, terminal=terminal, status=estado)} {cantidad}')
+
+            lineas.append('# HELP pocopan_sql_statements_total Sentencias SQL ejecutadas por endpoint')
+            lineas.append('# TYPE pocopan_sql_statements_total counter')
+            for endpoint, cantidad in sorted(self._sql_cantidad.items()):
+                lineas.append(f'pocopan_sql_statements_total{_etiquetas(endpoint=endpoint)} {cantidad}')
+
+            lineas.append('# HELP pocopan_sql_duration_seconds_total Tiempo acumulado en SQL por endpoint')
+            lineas.append('# TYPE pocopan_sql_duration_seconds_total counter')
+            for endpoint, segundos in sorted(self._sql_segundos.items()):
+                lineas.append(f'pocopan_sql_duration_seconds_total{_etiquetas(endpoint=endpoint)} {segundos}')
+
+            lineas.append('# HELP pocopan_sql_slow_total Sentencias SQL por encima del umbral de lentitud')
+            lineas.append('# TYPE pocopan_sql_slow_total counter')
+            for endpoint, cantidad in sorted(self._sql_lentas.items()):
+                lineas.append(f'pocopan_sql_slow_total{_etiquetas(endpoint=endpoint)} {cantidad}')
+
+            lineas.append('# HELP pocopan_n_plus_one_total Requests con la misma sentencia repetida sobre el umbral')
+            lineas.append('# TYPE pocopan_n_plus_one_total counter')
+            for endpoint, cantidad in sorted(self._n_mas_1.items()):
+                lineas.append(f'pocopan_n_plus_one_total{_etiquetas(endpoint=endpoint)} {cantidad}')
+
+        return '\n'.join(lineas) + '\n'
+
+    def respuesta(self):
+        return Response(self.texto_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
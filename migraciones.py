@@ -0,0 +1,434 @@
+import hashlib
+import json
+import logging
+import os
+
+from sqlalchemy import Date, Float, Integer, String, Time, column, inspect, table, text
+from sqlalchemy.exc import DBAPIError
+
+from werkzeug.security import generate_password_hash
+
+from dinero import a_pesos, subtotal_linea, totales_ticket
+from models import db, EsquemaVersion, Producto, Ticket, LineaVenta, Contador, CatalogoVersion, Terminal, Usuario, Carrito, CarritoItem, normalizar_nombre
+from ventas import vincular_productos
+
+logger = logging.getLogger(__name__)
+
+LOCK_MIGRACIONES = 2311
+# Escrita por `flask migrar` durante el build: el paquete desplegado ya sabe que su base está al día
+ARCHIVO_MARCA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.esquema_version')
+LOTE_BACKFILL = 1000
+
+MIGRACIONES = []
+
+def migracion(version, descripcion):
+    def registrar(funcion):
+        MIGRACIONES.append((version, descripcion, funcion))
+        return funcion
+    return registrar
+
+def _columnas(conexion, tabla):
+    return {c['name'] for c in inspect(conexion).get_columns(tabla)}
+
+def _existe_tabla(conexion, tabla):
+    return tabla in inspect(conexion).get_table_names()
+
+# La tabla ventas de antes de la migración 6 (una fila por línea con los datos del ticket repetidos)
+_VENTAS = table(
+    'ventas',
+    column('id', Integer),
+    column('id_venta', Integer),
+    column('fecha', Date),
+    column('hora', Time),
+    column('id_cliente', String),
+    column('producto_nombre', String),
+    column('cantidad', Integer),
+    column('precio_unitario', Float),
+    column('total_venta', Float),
+    column('vendedor', String),
+    column('id_terminal', String)
+)
+
+@migracion(1, 'productos.nombre_normalizado indexado para búsquedas por nombre')
+def _nombre_normalizado(conexion):
+    if 'nombre_normalizado' not in _columnas(conexion, 'productos'):
+        conexion.execute(text('ALTER TABLE productos ADD COLUMN nombre_normalizado VARCHAR(255)'))
+
+    pendientes = conexion.execute(text('SELECT id, nombre FROM productos WHERE nombre_normalizado IS NULL')).all()
+    for inicio in range(0, len(pendientes), LOTE_BACKFILL):
+        conexion.execute(
+            text('UPDATE productos SET nombre_normalizado = :normalizado WHERE id = :id'),
+            [{'id': i, 'normalizado': normalizar_nombre(n)} for i, n in pendientes[inicio:inicio + LOTE_BACKFILL]]
+        )
+
+    conexion.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_productos_nombre_normalizado ON productos (nombre_normalizado)'
+    ))
+
+TERMINALES_INICIALES = ['POS1', 'POS2', 'POS3', 'TODAS']
+PRODUCTOS_EJEMPLO = [
+    {'nombre': 'Cajas Verdes GRANJA ANIMALES DINOS', 'categoria': 'Ingenio', 'subcategoria': 'Madera Ingenio', 'precio_venta': 25000.0, 'proveedor': 'Proveedor A'},
+    {'nombre': 'Pezca Gusanos', 'categoria': 'Ingenio', 'subcategoria': 'Madera Ingenio', 'precio_venta': 30800.0, 'proveedor': 'Proveedor B'},
+    {'nombre': 'Juego de Mesa Clásico', 'categoria': 'Juego Meza', 'subcategoria': 'Estrategia', 'precio_venta': 15500.0, 'proveedor': 'Proveedor C'},
+    {'nombre': 'Rompecabezas 1000 Piezas', 'categoria': 'Puzzle', 'subcategoria': 'Educativo', 'precio_venta': 12000.0, 'proveedor': 'Proveedor D'},
+    {'nombre': 'Muñeco Coleccionable', 'categoria': 'Figuras', 'subcategoria': 'Acción', 'precio_venta': 8900.0, 'proveedor': 'Proveedor E'},
+]
+
+@migracion(2, 'datos iniciales: contadores, versión del catálogo y productos de ejemplo')
+def _datos_iniciales(conexion):
+    # Antes lo hacía init_db en cada arranque; como migración corre una sola vez por base
+    if conexion.execute(db.select(Producto.id).limit(1)).first() is None:
+        conexion.execute(db.insert(Producto), [
+            {**p, 'nombre_normalizado': normalizar_nombre(p['nombre'])} for p in PRODUCTOS_EJEMPLO
+        ])
+        logger.info(f"✅ {len(PRODUCTOS_EJEMPLO)} productos de ejemplo creados")
+
+    existentes = set(conexion.execute(db.select(Contador.terminal)).scalars())
+    faltantes = [{'terminal': t} for t in TERMINALES_INICIALES if t not in existentes]
+    if faltantes:
+        conexion.execute(db.insert(Contador), faltantes)
+
+    if conexion.execute(db.select(CatalogoVersion.id).where(CatalogoVersion.id == 1)).first() is None:
+        conexion.execute(db.insert(CatalogoVersion), {'id': 1, 'version': 0})
+
+# Los que antes estaban fijos en CONFIG['usuarios']; se cambian con `flask crear-usuario`
+USUARIOS_INICIALES = [
+    {'usuario': 'admin', 'password': 'admin123', 'rol': 'admin', 'terminal': 'TODAS'},
+    {'usuario': 'pos1', 'password': 'pos1123', 'rol': 'pos', 'terminal': 'POS1'},
+    {'usuario': 'pos2', 'password': 'pos2123', 'rol': 'pos', 'terminal': 'POS2'},
+    {'usuario': 'pos3', 'password': 'pos3123', 'rol': 'pos', 'terminal': 'POS3'},
+]
+
+@migracion(3, 'terminales y usuarios en la BD en lugar de CONFIG')
+def _terminales_y_usuarios(conexion):
+    # Cada contador existente (salvo el de TODAS) ya era una terminal de hecho
+    existentes = set(conexion.execute(db.select(Terminal.codigo)).scalars())
+    codigos = conexion.execute(
+        db.select(Contador.terminal).where(Contador.terminal != 'TODAS').order_by(Contador.terminal)
+    ).scalars().all()
+    nuevas = [{'codigo': c, 'nombre': f'Terminal {c}', 'activa': True} for c in codigos if c not in existentes]
+    if nuevas:
+        conexion.execute(db.insert(Terminal), nuevas)
+
+    if conexion.execute(db.select(Usuario.id).limit(1)).first() is None:
+        conexion.execute(db.insert(Usuario), [
+            {
+                'usuario': u['usuario'],
+                'password_hash': generate_password_hash(u['password']),
+                'rol': u['rol'],
+                'terminal': u['terminal'],
+                'activo': True
+            }
+            for u in USUARIOS_INICIALES
+        ])
+        logger.info(f"✅ {len(USUARIOS_INICIALES)} usuarios iniciales creados")
+
+@migracion(4, 'totales acumulados por carrito en la tabla carritos')
+def _totales_carritos(conexion):
+    Carrito.__table__.create(conexion, checkfirst=True)
+    # Con el esquema actual la tabla ya nace con el subtotal en centavos (migración 5)
+    if 'subtotal_centavos' in _columnas(conexion, 'carritos'):
+        columna, suma = 'subtotal_centavos', 'SUM(CAST(ROUND(subtotal * 100) AS BIGINT))'
+    else:
+        columna, suma = 'subtotal', 'SUM(subtotal)'
+    conexion.execute(text(
+        f'INSERT INTO carritos (carrito_id, lineas, unidades, {columna}, updated_at) '
+        f'SELECT carrito_id, COUNT(*), SUM(cantidad), {suma}, MAX(created_at) FROM carrito_items '
+        f'WHERE carrito_id NOT IN (SELECT carrito_id FROM carritos) GROUP BY carrito_id'
+    ))
+
+# La alícuota que estaba fija en el código cuando se registraron las ventas anteriores
+PORCENTAJE_IVA_HISTORICO = 21
+
+def _pasar_a_centavos(conexion, tabla, columna, nueva):
+    if nueva not in _columnas(conexion, tabla):
+        conexion.execute(text(f'ALTER TABLE {tabla} ADD COLUMN {nueva} BIGINT NOT NULL DEFAULT 0'))
+    if columna in _columnas(conexion, tabla):
+        conexion.execute(text(f'UPDATE {tabla} SET {nueva} = CAST(ROUND({columna} * 100) AS BIGINT)'))
+        conexion.execute(text(f'ALTER TABLE {tabla} DROP COLUMN {columna}'))
+
+@migracion(5, 'importes en centavos y totales por ticket en la tabla tickets')
+def _dinero_en_centavos(conexion):
+    _pasar_a_centavos(conexion, 'resumen_ventas', 'ingresos', 'ingresos_centavos')
+    _pasar_a_centavos(conexion, 'carritos', 'subtotal', 'subtotal_centavos')
+
+    Ticket.__table__.create(conexion, checkfirst=True)
+    if not _existe_tabla(conexion, 'ventas'):
+        return
+    _separar_cobros_repetidos(conexion)
+    _tickets_desde_ventas(conexion)
+
+def _separar_cobros_repetidos(conexion):
+    """Renumera los cobros que comparten (terminal, id_venta) por la carrera del contador anterior.
+
+    Las líneas de un mismo cobro comparten fecha, hora y cliente. El primer cobro
+    de cada grupo conserva el número; los demás reciben uno nuevo al final de su
+    terminal y el contador avanza.
+    """
+    cobros = db.select(
+        _VENTAS.c.id_terminal, _VENTAS.c.id_venta, _VENTAS.c.fecha, _VENTAS.c.hora, _VENTAS.c.id_cliente
+    ).distinct().subquery()
+    repetidos = conexion.execute(
+        db.select(cobros.c.id_terminal, cobros.c.id_venta)
+        .group_by(cobros.c.id_terminal, cobros.c.id_venta)
+        .having(db.func.count() > 1)
+    ).all()
+
+    for terminal, id_venta in repetidos:
+        del_grupo = (_VENTAS.c.id_terminal == terminal, _VENTAS.c.id_venta == id_venta)
+        partes = conexion.execute(
+            db.select(_VENTAS.c.fecha, _VENTAS.c.hora, _VENTAS.c.id_cliente)
+            .where(*del_grupo)
+            .group_by(_VENTAS.c.fecha, _VENTAS.c.hora, _VENTAS.c.id_cliente)
+            .order_by(db.func.min(_VENTAS.c.id))
+        ).all()
+        ultimo = max(
+            conexion.execute(db.select(db.func.max(_VENTAS.c.id_venta)).where(_VENTAS.c.id_terminal == terminal)).scalar() or 0,
+            conexion.execute(db.select(db.func.max(Ticket.id_venta)).where(Ticket.id_terminal == terminal)).scalar() or 0,
+            conexion.execute(db.select(Contador.ultima_venta).where(Contador.terminal == terminal)).scalar() or 0
+        )
+        for fecha, hora, id_cliente in partes[1:]:
+            ultimo += 1
+            conexion.execute(
+                _VENTAS.update().where(
+                    *del_grupo,
+                    _VENTAS.c.fecha.is_not_distinct_from(fecha),
+                    _VENTAS.c.hora.is_not_distinct_from(hora),
+                    _VENTAS.c.id_cliente.is_not_distinct_from(id_cliente)
+                ).values(id_venta=ultimo)
+            )
+            logger.warning(f"⚠️ Ticket {id_venta} de {terminal} repetido: el cobro de {fecha} {hora} pasa a ser el {ultimo}")
+        conexion.execute(
+            db.update(Contador.__table__)
+            .where(Contador.terminal == terminal, Contador.ultima_venta < ultimo)
+            .values(ultima_venta=ultimo)
+        )
+
+def _tickets_desde_ventas(conexion):
+    """Una cabecera en tickets por cada (terminal, id_venta) de ventas que todavía no la tenga"""
+    registrados = db.select(Ticket.id).where(
+        Ticket.id_terminal == _VENTAS.c.id_terminal, Ticket.id_venta == _VENTAS.c.id_venta
+    ).exists()
+    pendientes = conexion.execute(
+        db.select(
+            _VENTAS.c.id_terminal,
+            _VENTAS.c.id_venta,
+            db.func.min(_VENTAS.c.fecha),
+            db.func.min(_VENTAS.c.hora),
+            db.func.min(_VENTAS.c.id_cliente),
+            db.func.min(_VENTAS.c.vendedor),
+            db.func.sum(db.func.round(_VENTAS.c.total_venta * 100))
+        ).where(~registrados).group_by(_VENTAS.c.id_terminal, _VENTAS.c.id_venta)
+    ).all()
+    # La tabla tickets la crea esta misma migración con el modelo actual, que ya tiene cliente y vendedor
+    for inicio in range(0, len(pendientes), LOTE_BACKFILL):
+        conexion.execute(db.insert(Ticket), [
+            {
+                'id_terminal': terminal,
+                'id_venta': id_venta,
+                'fecha': fecha,
+                'hora': hora,
+                'id_cliente': id_cliente,
+                'vendedor': vendedor,
+                **totales_ticket(int(subtotal or 0), PORCENTAJE_IVA_HISTORICO),
+                'porcentaje_iva': PORCENTAJE_IVA_HISTORICO
+            }
+            for terminal, id_venta, fecha, hora, id_cliente, vendedor, subtotal in pendientes[inicio:inicio + LOTE_BACKFILL]
+        ])
+    if pendientes:
+        logger.info(f"✅ {len(pendientes)} tickets reconstruidos desde ventas")
+
+@migracion(6, 'ventas separadas en cabecera (tickets) y líneas (lineas_venta)')
+def _cabecera_y_lineas(conexion):
+    for columna in ('id_cliente', 'vendedor'):
+        if columna not in _columnas(conexion, 'tickets'):
+            conexion.execute(text(f"ALTER TABLE tickets ADD COLUMN {columna} VARCHAR(50) NOT NULL DEFAULT ''"))
+    LineaVenta.__table__.create(conexion, checkfirst=True)
+    if not _existe_tabla(conexion, 'ventas'):
+        return
+
+    # Cliente y vendedor se repetían en cada línea: pasan una sola vez a la cabecera
+    del_ticket = 'FROM ventas v WHERE v.id_terminal = tickets.id_terminal AND v.id_venta = tickets.id_venta'
+    conexion.execute(text(
+        f"UPDATE tickets SET id_cliente = (SELECT MIN(v.id_cliente) {del_ticket}), "
+        f"vendedor = (SELECT MIN(v.vendedor) {del_ticket}) "
+        f"WHERE id_cliente = '' AND EXISTS (SELECT 1 {del_ticket})"
+    ))
+
+    # Se conservan los ids de línea: son los mismos que ya usan las particiones archivadas
+    lineas = conexion.execute(text(
+        'INSERT INTO lineas_venta (id, ticket_id, producto_nombre, cantidad, precio_centavos) '
+        'SELECT v.id, t.id, v.producto_nombre, v.cantidad, CAST(ROUND(v.precio_unitario * 100) AS BIGINT) '
+        'FROM ventas v JOIN tickets t ON t.id_terminal = v.id_terminal AND t.id_venta = v.id_venta '
+        'WHERE v.id NOT IN (SELECT id FROM lineas_venta)'
+    )).rowcount
+    if conexion.dialect.name == 'postgresql':
+        conexion.execute(text(
+            "SELECT setval(pg_get_serial_sequence('lineas_venta', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM lineas_venta"
+        ))
+    conexion.execute(text('DROP TABLE ventas'))
+    logger.info(f"✅ {lineas} líneas de venta pasadas a lineas_venta")
+
+@migracion(7, 'lineas_venta.producto_id vinculado por nombre al catálogo')
+def _producto_en_lineas(conexion):
+    if 'producto_id' not in _columnas(conexion, 'lineas_venta'):
+        conexion.execute(text(
+            'ALTER TABLE lineas_venta ADD COLUMN producto_id INTEGER REFERENCES productos (id) ON DELETE SET NULL'
+        ))
+    conexion.execute(text('CREATE INDEX IF NOT EXISTS ix_lineas_venta_producto_id ON lineas_venta (producto_id)'))
+    vinculadas = vincular_productos(conexion, LOTE_BACKFILL)
+    if vinculadas:
+        logger.info(f"✅ {vinculadas} líneas de venta vinculadas a su producto")
+
+@migracion(8, 'índices compuestos por terminal y fecha e índice parcial de productos disponibles')
+def _indices_compuestos(conexion):
+    # (id_terminal, id_venta) ya lo cubre el índice único uq_ticket_terminal_venta
+    conexion.execute(text('CREATE INDEX IF NOT EXISTS ix_tickets_terminal_fecha ON tickets (id_terminal, fecha)'))
+    conexion.execute(text('CREATE INDEX IF NOT EXISTS ix_resumen_terminal_fecha ON resumen_ventas (id_terminal, fecha)'))
+    conexion.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_productos_disponibles ON productos (id) WHERE estado = 'Disponible'"
+    ))
+
+@migracion(9, 'claves de idempotencia únicas por terminal y no en toda la base')
+def _claves_por_terminal(conexion):
+    globales = [u for u in inspect(conexion).get_unique_constraints('claves_venta') if u['column_names'] == ['clave']]
+    if not globales:
+        return
+    if conexion.dialect.name == 'postgresql':
+        for restriccion in globales:
+            conexion.execute(text(f'ALTER TABLE claves_venta DROP CONSTRAINT {restriccion["name"]}'))
+        conexion.execute(text('ALTER TABLE claves_venta ADD CONSTRAINT uq_clave_venta_terminal UNIQUE (id_terminal, clave)'))
+        return
+
+    # SQLite no puede borrar una restricción: se rehace la tabla conservando los ids
+    conexion.execute(text('ALTER TABLE claves_venta RENAME TO claves_venta_anterior'))
+    conexion.execute(text('DROP INDEX IF EXISTS ix_claves_venta_created_at'))
+    conexion.execute(text(
+        'CREATE TABLE claves_venta ('
+        'id INTEGER NOT NULL PRIMARY KEY, clave VARCHAR(64) NOT NULL, id_terminal VARCHAR(10) NOT NULL, '
+        'id_venta INTEGER NOT NULL, resumen TEXT NOT NULL, created_at DATETIME, '
+        'CONSTRAINT uq_clave_venta_terminal UNIQUE (id_terminal, clave))'
+    ))
+    conexion.execute(text('CREATE INDEX ix_claves_venta_created_at ON claves_venta (created_at)'))
+    conexion.execute(text(
+        'INSERT INTO claves_venta (id, clave, id_terminal, id_venta, resumen, created_at) '
+        'SELECT id, clave, id_terminal, id_venta, resumen, created_at FROM claves_venta_anterior'
+    ))
+    conexion.execute(text('DROP TABLE claves_venta_anterior'))
+
+@migracion(10, 'una sola línea por producto y precio en cada carrito')
+def _lineas_de_carrito_unicas(conexion):
+    # Las líneas que duplicaron dos agregados simultáneos se funden en la primera
+    repetidas = conexion.execute(text(
+        'SELECT carrito_id, producto, precio, MIN(id) AS id, SUM(cantidad) AS cantidad, COUNT(*) AS lineas '
+        'FROM carrito_items GROUP BY carrito_id, producto, precio HAVING COUNT(*) > 1'
+    )).all()
+    for fila in repetidas:
+        conexion.execute(
+            text('UPDATE carrito_items SET cantidad = :cantidad, subtotal = :subtotal WHERE id = :id'),
+            {'id': fila.id, 'cantidad': fila.cantidad, 'subtotal': a_pesos(subtotal_linea(fila.precio, fila.cantidad))}
+        )
+        conexion.execute(
+            text('DELETE FROM carrito_items WHERE carrito_id = :carrito AND producto = :producto AND precio = :precio AND id <> :id'),
+            {'carrito': fila.carrito_id, 'producto': fila.producto, 'precio': fila.precio, 'id': fila.id}
+        )
+        conexion.execute(
+            text('UPDATE carritos SET lineas = lineas - :sobrantes WHERE carrito_id = :carrito'),
+            {'carrito': fila.carrito_id, 'sobrantes': fila.lineas - 1}
+        )
+    if repetidas:
+        logger.info(f"✅ {len(repetidas)} líneas de carrito repetidas unificadas")
+    conexion.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_carrito_item_linea ON carrito_items (carrito_id, producto, precio)'
+    ))
+
+@migracion(11, 'ids de carrito_items que SQLite no reusa al borrar líneas')
+def _ids_de_carrito_sin_reuso(conexion):
+    # En PostgreSQL la secuencia nunca repite ids; SQLite sin AUTOINCREMENT reusa el mayor borrado
+    if conexion.dialect.name != 'sqlite':
+        return
+    definicion = conexion.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'carrito_items'"
+    )).scalar()
+    if not definicion or 'AUTOINCREMENT' in definicion.upper():
+        return
+
+    conexion.execute(text('ALTER TABLE carrito_items RENAME TO carrito_items_anterior'))
+    for indice in ('ix_carrito_items_carrito_id', 'ix_carrito_items_created_at', 'uq_carrito_item_linea'):
+        conexion.execute(text(f'DROP INDEX IF EXISTS {indice}'))
+    conexion.execute(text(
+        'CREATE TABLE carrito_items ('
+        'id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, carrito_id VARCHAR(32) NOT NULL, producto VARCHAR(255) NOT NULL, '
+        'cantidad INTEGER NOT NULL, precio FLOAT NOT NULL, subtotal FLOAT NOT NULL, proveedor VARCHAR(100), '
+        'categoria VARCHAR(100), created_at DATETIME)'
+    ))
+    conexion.execute(text('CREATE INDEX ix_carrito_items_carrito_id ON carrito_items (carrito_id)'))
+    conexion.execute(text('CREATE INDEX ix_carrito_items_created_at ON carrito_items (created_at)'))
+    conexion.execute(text(
+        'CREATE UNIQUE INDEX uq_carrito_item_linea ON carrito_items (carrito_id, producto, precio)'
+    ))
+    # Insertar con los ids de antes deja la secuencia por encima del mayor
+    conexion.execute(text(
+        'INSERT INTO carrito_items (id, carrito_id, producto, cantidad, precio, subtotal, proveedor, categoria, created_at) '
+        'SELECT id, carrito_id, producto, cantidad, precio, subtotal, proveedor, categoria, created_at FROM carrito_items_anterior'
+    ))
+    conexion.execute(text('DROP TABLE carrito_items_anterior'))
+
+def _version(conexion):
+    version = conexion.execute(
+        db.select(EsquemaVersion.version).where(EsquemaVersion.id == 1)
+    ).scalar()
+    return version or 0
+
+def _guardar_version(conexion, version):
+    tabla = EsquemaVersion.__table__
+    if not conexion.execute(tabla.update().where(tabla.c.id == 1).values(version=version)).rowcount:
+        conexion.execute(tabla.insert().values(id=1, version=version))
+
+def version_esquema():
+    with db.engine.connect() as conexion:
+        return _version(conexion)
+
+def esquema_al_dia():
+    """True si la marca de versión ya tiene todas las migraciones; una sola consulta"""
+    try:
+        return version_esquema() >= ultima_version()
+    except DBAPIError:
+        # Base nueva: todavía no existe la tabla esquema_version
+        return False
+
+def ultima_version():
+    return max((v for v, _, _ in MIGRACIONES), default=0)
+
+def aplicar_migraciones():
+    """Aplica en orden las migraciones pendientes, cada una en su propia transacción"""
+    aplicadas = 0
+    for version, descripcion, funcion in sorted(MIGRACIONES, key=lambda m: m[0]):
+        with db.engine.begin() as conexion:
+            if conexion.dialect.name == 'postgresql':
+                # Evita que dos instancias arrancando a la vez apliquen la misma migración
+                conexion.execute(text('SELECT pg_advisory_xact_lock(:lock)'), {'lock': LOCK_MIGRACIONES})
+            if version <= _version(conexion):
+                continue
+            logger.info(f"🛠️ Migración {version}: {descripcion}")
+            funcion(conexion)
+            _guardar_version(conexion, version)
+            aplicadas += 1
+    return aplicadas
+
+def _huella(database_url):
+    return hashlib.sha256(database_url.encode('utf-8')).hexdigest()[:16]
+
+def marcar_esquema(database_url):
+    """Deja constancia en disco de que esta base tiene todas las migraciones"""
+    with open(ARCHIVO_MARCA, 'w') as archivo:
+        json.dump({'version': ultima_version(), 'base': _huella(database_url)}, archivo)
+
+def esquema_marcado(database_url):
+    """True si el build ya migró esta misma base a la última versión; no toca la BD"""
+    try:
+        with open(ARCHIVO_MARCA) as archivo:
+            marca = json.load(archivo)
+    except (OSError, ValueError):
+        return False
+    return marca.get('version') == ultima_version() and marca.get('base') == _huella(database_url)
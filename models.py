@@ -1,13 +1,21 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import re
+
+from dinero import a_pesos
 
 db = SQLAlchemy()
 
+def normalizar_nombre(nombre):
+    """Clave de búsqueda de productos: espacios colapsados y sin distinción de mayúsculas"""
+    return re.sub(r'\s+', ' ', nombre or '').strip().casefold()
+
 class Producto(db.Model):
     __tablename__ = 'productos'
     
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(255), unique=True, nullable=False, index=True)
+    nombre_normalizado = db.Column(db.String(255), nullable=True, index=True)
     categoria = db.Column(db.String(100), nullable=False, default='Sin Categoría')
     subcategoria = db.Column(db.String(100), nullable=True)
     precio_venta = db.Column(db.Float, nullable=False)
@@ -16,6 +24,13 @@ class Producto(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Solo los disponibles: es lo que leen el catálogo en memoria y el conteo del dashboard
+        db.Index('ix_productos_disponibles', 'id',
+                 postgresql_where=db.text("estado = 'Disponible'"),
+                 sqlite_where=db.text("estado = 'Disponible'")),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -27,41 +42,54 @@ class Producto(db.Model):
             'Estado': self.estado
         }
     
+    @classmethod
+    def buscar_por_nombre(cls, nombre):
+        return cls.query.filter(cls.nombre_normalizado == normalizar_nombre(nombre)).first()
+    
     def __repr__(self):
         return f'<Producto {self.nombre}>'
 
-class Venta(db.Model):
-    __tablename__ = 'ventas'
+@db.event.listens_for(Producto.nombre, 'set')
+def _actualizar_nombre_normalizado(producto, valor, anterior, iniciador):
+    producto.nombre_normalizado = normalizar_nombre(valor)
+
+class Ticket(db.Model):
+    __tablename__ = 'tickets'
     
     id = db.Column(db.Integer, primary_key=True)
-    id_venta = db.Column(db.Integer, nullable=False, index=True)
+    id_terminal = db.Column(db.String(10), nullable=False)
+    id_venta = db.Column(db.Integer, nullable=False)
     fecha = db.Column(db.Date, nullable=False, index=True)
     hora = db.Column(db.Time, nullable=False)
     id_cliente = db.Column(db.String(50), nullable=False)
-    producto_nombre = db.Column(db.String(255), nullable=False, index=True)
-    cantidad = db.Column(db.Integer, nullable=False)
-    precio_unitario = db.Column(db.Float, nullable=False)
-    total_venta = db.Column(db.Float, nullable=False)
     vendedor = db.Column(db.String(50), nullable=False)
-    id_terminal = db.Column(db.String(10), nullable=False, index=True)
+    subtotal_centavos = db.Column(db.BigInteger, nullable=False)
+    iva_centavos = db.Column(db.BigInteger, nullable=False)
+    total_centavos = db.Column(db.BigInteger, nullable=False)
+    porcentaje_iva = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
-        return {
-            'ID_Venta': self.id_venta,
-            'Fecha': str(self.fecha),
-            'Hora': str(self.hora),
-            'ID_Cliente': self.id_cliente,
-            'Producto': self.producto_nombre,
-            'Cantidad': self.cantidad,
-            'Precio_Unitario': self.precio_unitario,
-            'Total_Venta': self.total_venta,
-            'Vendedor': self.vendedor,
-            'ID_Terminal': self.id_terminal
-        }
+    __table_args__ = (
+        db.UniqueConstraint('id_terminal', 'id_venta', name='uq_ticket_terminal_venta'),
+        db.Index('ix_tickets_terminal_fecha', 'id_terminal', 'fecha'),
+    )
     
     def __repr__(self):
-        return f'<Venta {self.id_venta} - {self.producto_nombre}>'
+        return f'<Ticket {self.id_terminal}-{self.id_venta}>'
+
+class LineaVenta(db.Model):
+    __tablename__ = 'lineas_venta'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False, index=True)
+    # El nombre queda como se vendió; el id sigue al producto aunque lo renombren
+    producto_id = db.Column(db.Integer, db.ForeignKey('productos.id', ondelete='SET NULL'), nullable=True, index=True)
+    producto_nombre = db.Column(db.String(255), nullable=False)
+    cantidad = db.Column(db.Integer, nullable=False)
+    precio_centavos = db.Column(db.BigInteger, nullable=False)
+    
+    def __repr__(self):
+        return f'<LineaVenta {self.ticket_id} - {self.producto_nombre}>'
 
 class Contador(db.Model):
     __tablename__ = 'contadores'
@@ -82,3 +110,143 @@ class Contador(db.Model):
     
     def __repr__(self):
         return f'<Contador {self.terminal}>'
+
+class ResumenVenta(db.Model):
+    __tablename__ = 'resumen_ventas'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    fecha = db.Column(db.Date, nullable=False, index=True)
+    id_terminal = db.Column(db.String(10), nullable=False)
+    tickets = db.Column(db.Integer, nullable=False, default=0)
+    lineas = db.Column(db.Integer, nullable=False, default=0)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingresos_centavos = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('fecha', 'id_terminal', name='uq_resumen_fecha_terminal'),
+        db.Index('ix_resumen_terminal_fecha', 'id_terminal', 'fecha'),
+    )
+    
+    def to_dict(self):
+        return {
+            'fecha': str(self.fecha),
+            'id_terminal': self.id_terminal,
+            'tickets': self.tickets,
+            'lineas': self.lineas,
+            'unidades': self.unidades,
+            'ingresos': a_pesos(self.ingresos_centavos)
+        }
+    
+    def __repr__(self):
+        return f'<ResumenVenta {self.fecha} - {self.id_terminal}>'
+
+class CatalogoVersion(db.Model):
+    __tablename__ = 'catalogo_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CatalogoVersion {self.version}>'
+
+class Carrito(db.Model):
+    __tablename__ = 'carritos'
+    
+    carrito_id = db.Column(db.String(32), primary_key=True)
+    lineas = db.Column(db.Integer, nullable=False, default=0)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    subtotal_centavos = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<Carrito {self.carrito_id}>'
+
+class CarritoItem(db.Model):
+    __tablename__ = 'carrito_items'
+    __table_args__ = (
+        # Una línea por producto y precio: el agregado la suma con INSERT ... ON CONFLICT
+        db.Index('uq_carrito_item_linea', 'carrito_id', 'producto', 'precio', unique=True),
+        # El cobro identifica las líneas por id: SQLite no debe reusar el de una línea borrada
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    carrito_id = db.Column(db.String(32), nullable=False, index=True)
+    producto = db.Column(db.String(255), nullable=False)
+    cantidad = db.Column(db.Integer, nullable=False)
+    precio = db.Column(db.Float, nullable=False)
+    subtotal = db.Column(db.Float, nullable=False)
+    proveedor = db.Column(db.String(100))
+    categoria = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'producto': self.producto,
+            'cantidad': self.cantidad,
+            'precio': self.precio,
+            'subtotal': self.subtotal,
+            'proveedor': self.proveedor,
+            'categoria': self.categoria,
+            'timestamp': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<CarritoItem {self.carrito_id} - {self.producto}>'
+
+class EsquemaVersion(db.Model):
+    __tablename__ = 'esquema_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<EsquemaVersion {self.version}>'
+
+class ClaveVenta(db.Model):
+    __tablename__ = 'claves_venta'
+    __table_args__ = (
+        # La clave la genera cada terminal: solo tiene que ser única dentro de ella
+        db.UniqueConstraint('id_terminal', 'clave', name='uq_clave_venta_terminal'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    clave = db.Column(db.String(64), nullable=False)
+    id_terminal = db.Column(db.String(10), nullable=False)
+    id_venta = db.Column(db.Integer, nullable=False)
+    resumen = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<ClaveVenta {self.clave} - {self.id_venta}>'
+
+class Terminal(db.Model):
+    __tablename__ = 'terminales'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    codigo = db.Column(db.String(10), unique=True, nullable=False)
+    nombre = db.Column(db.String(100), nullable=True)
+    sucursal = db.Column(db.String(100), nullable=True, index=True)
+    activa = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Terminal {self.codigo}>'
+
+class Usuario(db.Model):
+    __tablename__ = 'usuarios'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    usuario = db.Column(db.String(50), unique=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
+    rol = db.Column(db.String(20), nullable=False, default='pos')
+    terminal = db.Column(db.String(10), nullable=False)
+    activo = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Usuario {self.usuario}>'
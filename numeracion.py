@@ -0,0 +1,85 @@
+import logging
+import threading
+
+from sqlalchemy import select, update
+
+from models import db, Contador
+
+logger = logging.getLogger(__name__)
+
+class AsignadorTickets:
+    """Numeración de tickets por terminal sin leer-modificar-escribir el contador.
+
+    Cada reserva es un UPDATE atómico (con RETURNING cuando el motor lo soporta)
+    confirmado en su propia transacción, así dos checkouts concurrentes nunca
+    obtienen el mismo id_venta. Con `tamano_bloque` > 1 cada worker reserva un
+    bloque de números y los siguientes tickets no tocan la tabla contadores;
+    los números de un bloque sin usar quedan como saltos en la numeración.
+    """
+
+    def __init__(self, tamano_bloque=1):
+        self.tamano_bloque = max(1, int(tamano_bloque))
+        self._bloques = {}
+        self._lock = threading.Lock()
+
+    def _reservar(self, terminal, cantidad):
+        tabla = Contador.__table__
+        stmt = update(tabla).where(tabla.c.terminal == terminal).values(
+            ultima_venta=tabla.c.ultima_venta + cantidad,
+            ultimo_cliente=tabla.c.ultimo_cliente + cantidad
+        )
+
+        with db.engine.begin() as conexion:
+            if conexion.dialect.update_returning:
+                fila = conexion.execute(stmt.returning(tabla.c.ultima_venta, tabla.c.ultimo_cliente)).first()
+            else:
+                # Sin RETURNING: el UPDATE ya tomó el lock de la fila, la lectura dentro de la misma transacción es consistente
+                fila = None
+                if conexion.execute(stmt).rowcount:
+                    fila = conexion.execute(
+                        select(tabla.c.ultima_venta, tabla.c.ultimo_cliente).where(tabla.c.terminal == terminal)
+                    ).first()
+
+        if fila is None:
+            return None
+
+        ultima_venta, ultimo_cliente = fila
+        if cantidad > 1:
+            logger.info(f"🔢 Bloque de tickets {ultima_venta - cantidad + 1}-{ultima_venta} reservado para {terminal}")
+        return [ultima_venta - cantidad + 1, ultimo_cliente - cantidad + 1, cantidad]
+
+    def siguiente(self, terminal):
+        """Devuelve (id_venta, numero_cliente) para el próximo ticket, o None si la terminal no tiene contador"""
+        if self.tamano_bloque == 1:
+            bloque = self._reservar(terminal, 1)
+            return (bloque[0], bloque[1]) if bloque else None
+
+        with self._lock:
+            bloque = self._bloques.get(terminal)
+            if not bloque or bloque[2] == 0:
+                bloque = self._reservar(terminal, self.tamano_bloque)
+                if bloque is None:
+                    return None
+                self._bloques[terminal] = bloque
+
+            id_venta, numero_cliente = bloque[0], bloque[1]
+            bloque[0] += 1
+            bloque[1] += 1
+            bloque[2] -= 1
+            return id_venta, numero_cliente
+
+    def reservar(self, terminal, cantidad):
+        """Lista de `cantidad` pares (id_venta, numero_cliente) consecutivos tomados de una sola vez del contador"""
+        bloque = self._reservar(terminal, cantidad)
+        if bloque is None:
+            return None
+        return [(bloque[0] + i, bloque[1] + i) for i in range(cantidad)]
+
+    def proximo_cliente(self, terminal):
+        """Número de cliente que probablemente reciba el próximo ticket (solo para mostrar)"""
+        with self._lock:
+            bloque = self._bloques.get(terminal)
+            if bloque and bloque[2]:
+                return bloque[1]
+        ultimo = db.session.query(Contador.ultimo_cliente).filter(Contador.terminal == terminal).scalar()
+        return (ultimo or 0) + 1
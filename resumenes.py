@@ -0,0 +1,140 @@
+from datetime import date, datetime
+import logging
+
+from sqlalchemy import DateTime, case, distinct, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from dinero import a_pesos
+from models import db, Ticket, LineaVenta, ResumenVenta
+from archivo import agregados_archivo
+
+logger = logging.getLogger(__name__)
+
+def insert_con_upsert():
+    """`insert` del dialecto con ON CONFLICT (PostgreSQL y SQLite); None en otros motores"""
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        return pg_insert
+    if dialecto == 'sqlite':
+        return sqlite_insert
+    return None
+
+def registrar_venta(fecha, id_terminal, lineas, unidades, ingresos_centavos):
+    """Suma un ticket al resumen diario de la terminal (sin commit, va en la transacción de la venta)"""
+    insert = insert_con_upsert()
+
+    if insert is not None:
+        tabla = ResumenVenta.__table__
+        stmt = insert(tabla).values(
+            fecha=fecha,
+            id_terminal=id_terminal,
+            tickets=1,
+            lineas=lineas,
+            unidades=unidades,
+            ingresos_centavos=ingresos_centavos
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['fecha', 'id_terminal'],
+            set_={
+                'tickets': tabla.c.tickets + 1,
+                'lineas': tabla.c.lineas + stmt.excluded.lineas,
+                'unidades': tabla.c.unidades + stmt.excluded.unidades,
+                'ingresos_centavos': tabla.c.ingresos_centavos + stmt.excluded.ingresos_centavos,
+                'updated_at': datetime.utcnow()
+            }
+        )
+        db.session.execute(stmt)
+        return
+
+    resumen = ResumenVenta.query.filter_by(fecha=fecha, id_terminal=id_terminal).with_for_update().first()
+    if not resumen:
+        resumen = ResumenVenta(fecha=fecha, id_terminal=id_terminal, tickets=0, lineas=0, unidades=0, ingresos_centavos=0)
+        db.session.add(resumen)
+    resumen.tickets += 1
+    resumen.lineas += lineas
+    resumen.unidades += unidades
+    resumen.ingresos_centavos += ingresos_centavos
+
+def obtener_resumen(id_terminal=None, hoy=None):
+    """Totales históricos y del día leyendo solo la tabla de resúmenes; los ingresos se suman en centavos"""
+    hoy = hoy or date.today()
+    es_hoy = ResumenVenta.fecha == hoy
+
+    consulta = db.session.query(
+        func.coalesce(func.sum(ResumenVenta.tickets), 0),
+        func.coalesce(func.sum(ResumenVenta.ingresos_centavos), 0),
+        func.count(distinct(ResumenVenta.fecha)),
+        func.coalesce(func.sum(case((es_hoy, ResumenVenta.tickets), else_=0)), 0),
+        func.coalesce(func.sum(case((es_hoy, ResumenVenta.ingresos_centavos), else_=0)), 0),
+        func.coalesce(func.sum(case((es_hoy, ResumenVenta.unidades), else_=0)), 0)
+    )
+    if id_terminal is not None:
+        consulta = consulta.filter(ResumenVenta.id_terminal == id_terminal)
+
+    tickets, ingresos, dias, tickets_hoy, ingresos_hoy, unidades_hoy = consulta.one()
+
+    return {
+        'tickets': int(tickets),
+        'ingresos': a_pesos(ingresos),
+        'ingresos_centavos': int(ingresos),
+        'dias': int(dias),
+        'tickets_hoy': int(tickets_hoy),
+        'ingresos_hoy': a_pesos(ingresos_hoy),
+        'ingresos_hoy_centavos': int(ingresos_hoy),
+        'unidades_hoy': int(unidades_hoy)
+    }
+
+def _sumar_archivados(archivados):
+    existentes = {
+        (r.fecha, r.id_terminal): r
+        for r in ResumenVenta.query.filter(ResumenVenta.fecha.in_({a['fecha'] for a in archivados}))
+    }
+    for agregado in archivados:
+        resumen = existentes.get((agregado['fecha'], agregado['id_terminal']))
+        if resumen is None:
+            db.session.add(ResumenVenta(**agregado))
+            continue
+        # Día con ventas archivadas y otras que llegaron después a la tabla
+        resumen.tickets += agregado['tickets']
+        resumen.lineas += agregado['lineas']
+        resumen.unidades += agregado['unidades']
+        resumen.ingresos_centavos += agregado['ingresos_centavos']
+
+def reconstruir_resumenes():
+    """Recalcula todos los resúmenes a partir de las cabeceras de ticket y del archivo Parquet"""
+    por_ticket = db.select(
+        LineaVenta.ticket_id,
+        func.count(LineaVenta.id).label('lineas'),
+        func.sum(LineaVenta.cantidad).label('unidades')
+    ).group_by(LineaVenta.ticket_id).subquery()
+    agregados = db.select(
+        Ticket.fecha,
+        Ticket.id_terminal,
+        func.count(Ticket.id),
+        func.coalesce(func.sum(por_ticket.c.lineas), 0),
+        func.coalesce(func.sum(por_ticket.c.unidades), 0),
+        func.coalesce(func.sum(Ticket.subtotal_centavos), 0),
+        # INSERT ... SELECT no aplica el default de la columna
+        literal(datetime.utcnow(), DateTime)
+    ).outerjoin(por_ticket, por_ticket.c.ticket_id == Ticket.id).group_by(Ticket.fecha, Ticket.id_terminal)
+
+    try:
+        db.session.query(ResumenVenta).delete()
+        db.session.execute(
+            ResumenVenta.__table__.insert().from_select(
+                ['fecha', 'id_terminal', 'tickets', 'lineas', 'unidades', 'ingresos_centavos', 'updated_at'],
+                agregados
+            )
+        )
+        archivados = agregados_archivo()
+        if archivados:
+            _sumar_archivados(archivados)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    total = ResumenVenta.query.count()
+    logger.info(f"✅ {total} resúmenes diarios reconstruidos")
+    return total
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+import gzip
+import json
+import logging
+import threading
+
+from models import db, Producto
+
+logger = logging.getLogger(__name__)
+
+ESTADO_DISPONIBLE = 'Disponible'
+# Los updated_at se fijan al hacer flush y no al commit: un delta repite los
+# cambios de los últimos segundos para no perder transacciones que se confirmaron tarde
+MARGEN_DELTA = timedelta(seconds=30)
+NIVEL_GZIP = 6
+
+_lock = threading.Lock()
+_completo = None
+
+def _interner(valores):
+    tabla = {}
+    indices = [tabla.setdefault(v or '', len(tabla)) for v in valores]
+    return list(tabla), indices
+
+def _marca():
+    return db.session.query(db.func.max(Producto.updated_at)).scalar()
+
+def _columnar(filas):
+    categorias, idx_categorias = _interner(f.categoria for f in filas)
+    subcategorias, idx_subcategorias = _interner(f.subcategoria for f in filas)
+    proveedores, idx_proveedores = _interner(f.proveedor for f in filas)
+    return {
+        'categorias': categorias,
+        'subcategorias': subcategorias,
+        'proveedores': proveedores,
+        'columnas': {
+            'id': [f.id for f in filas],
+            'nombre': [f.nombre for f in filas],
+            'categoria': idx_categorias,
+            'subcategoria': idx_subcategorias,
+            'precio_venta': [f.precio_venta for f in filas],
+            'proveedor': idx_proveedores
+        }
+    }
+
+def _consulta():
+    return db.session.query(
+        Producto.id,
+        Producto.nombre,
+        Producto.categoria,
+        Producto.subcategoria,
+        Producto.precio_venta,
+        Producto.proveedor,
+        Producto.estado
+    ).order_by(Producto.id)
+
+def construir_snapshot(version, desde=None):
+    """Catálogo disponible en columnas con strings internados.
+
+    Con `desde` (la `marca` de un snapshot anterior) solo trae los productos
+    modificados después; los que dejaron de estar disponibles van en `quitados`.
+    `total` permite al cliente detectar productos borrados y pedir el completo.
+    """
+    marca = _marca()
+    if desde is None:
+        filas = _consulta().filter(Producto.estado == ESTADO_DISPONIBLE).all()
+        quitados = []
+    else:
+        cambios = _consulta().filter(Producto.updated_at > desde - MARGEN_DELTA).all()
+        filas = [f for f in cambios if f.estado == ESTADO_DISPONIBLE]
+        quitados = [f.id for f in cambios if f.estado != ESTADO_DISPONIBLE]
+
+    total = db.session.query(db.func.count(Producto.id)).filter(Producto.estado == ESTADO_DISPONIBLE).scalar()
+    return {
+        'version': version,
+        'marca': marca.isoformat() if marca else None,
+        'completo': desde is None,
+        'total': total,
+        'quitados': quitados,
+        **_columnar(filas)
+    }
+
+def serializar(snapshot):
+    return json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def snapshot_completo(version):
+    """(json, json_gzip) del snapshot completo, armado una sola vez por versión del catálogo"""
+    global _completo
+
+    completo = _completo
+    if completo is not None and completo[0] == version:
+        return completo[1], completo[2]
+
+    with _lock:
+        if _completo is None or _completo[0] != version:
+            cuerpo = serializar(construir_snapshot(version))
+            _completo = (version, cuerpo, gzip.compress(cuerpo, NIVEL_GZIP))
+            logger.info(f"🗜️ Snapshot del catálogo v{version}: {len(cuerpo)} bytes, {len(_completo[2])} comprimido")
+        return _completo[1], _completo[2]
+
+def parsear_marca(texto):
+    try:
+        return datetime.fromisoformat(texto)
+    except (TypeError, ValueError):
+        return None
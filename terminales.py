@@ -0,0 +1,115 @@
+from collections import namedtuple
+import logging
+import os
+import re
+import threading
+from time import monotonic
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from models import db, Terminal, Usuario, Contador
+
+logger = logging.getLogger(__name__)
+
+# Pseudo-terminal de los administradores: ve el dashboard y las exportaciones de todas
+TERMINAL_TODAS = 'TODAS'
+ROLES = ('admin', 'pos')
+TTL_REGISTRO = float(os.getenv('TERMINALES_TTL', '60'))
+
+UsuarioRegistrado = namedtuple('UsuarioRegistrado', ['usuario', 'password_hash', 'rol', 'terminal'])
+TerminalRegistrada = namedtuple('TerminalRegistrada', ['codigo', 'nombre', 'sucursal'])
+Registro = namedtuple('Registro', ['vence', 'usuarios', 'terminales'])
+
+_lock = threading.Lock()
+_registro = None
+
+def _cargar_registro():
+    terminales = tuple(
+        TerminalRegistrada(*fila) for fila in db.session.query(
+            Terminal.codigo, Terminal.nombre, Terminal.sucursal
+        ).filter(Terminal.activa.is_(True)).order_by(Terminal.sucursal, Terminal.codigo)
+    )
+    usuarios = {
+        fila.usuario: UsuarioRegistrado(*fila) for fila in db.session.query(
+            Usuario.usuario, Usuario.password_hash, Usuario.rol, Usuario.terminal
+        ).filter(Usuario.activo.is_(True))
+    }
+    return Registro(monotonic() + TTL_REGISTRO, usuarios, terminales)
+
+def obtener_registro():
+    """Usuarios y terminales activos en memoria; se releen de la BD cada TTL_REGISTRO segundos"""
+    global _registro
+
+    registro = _registro
+    if registro is not None and registro.vence > monotonic():
+        return registro
+
+    with _lock:
+        if _registro is None or _registro.vence <= monotonic():
+            _registro = _cargar_registro()
+            logger.info(f"🖥️ Registro cargado: {len(_registro.terminales)} terminales, {len(_registro.usuarios)} usuarios")
+        return _registro
+
+def invalidar_registro():
+    """Descarta el registro de este proceso; los demás workers lo ven al vencer el TTL"""
+    global _registro
+    with _lock:
+        _registro = None
+
+def terminales_activas():
+    return obtener_registro().terminales
+
+def existe_terminal(codigo):
+    return any(t.codigo == codigo for t in obtener_registro().terminales)
+
+def autenticar(usuario, password):
+    """El usuario activo si la contraseña coincide, o None.
+
+    Se lee de la BD y no del registro en memoria: un usuario o una terminal
+    desactivados no pueden iniciar sesión mientras el registro sigue vigente.
+    """
+    fila = db.session.query(
+        Usuario.usuario, Usuario.password_hash, Usuario.rol, Usuario.terminal
+    ).outerjoin(Terminal, Terminal.codigo == Usuario.terminal).filter(
+        Usuario.usuario == (usuario or ''),
+        Usuario.activo.is_(True),
+        db.or_(Usuario.rol == 'admin', Terminal.activa.is_(True))
+    ).first()
+    if fila is None or not check_password_hash(fila.password_hash, password or ''):
+        return None
+    return UsuarioRegistrado(*fila)
+
+def crear_terminal(codigo, nombre=None, sucursal=None):
+    """Alta de una terminal con su contador de tickets (sin commit)"""
+    codigo = (codigo or '').strip().upper()
+    if not re.fullmatch(r'[A-Z0-9_-]{1,10}', codigo) or codigo == TERMINAL_TODAS:
+        raise ValueError('Código de terminal inválido (hasta 10 letras, números, - o _)')
+    if Terminal.query.filter_by(codigo=codigo).first():
+        raise ValueError(f'La terminal {codigo} ya existe')
+
+    terminal = Terminal(codigo=codigo, nombre=nombre or f'Terminal {codigo}', sucursal=sucursal)
+    db.session.add(terminal)
+    if not Contador.query.filter_by(terminal=codigo).first():
+        db.session.add(Contador(terminal=codigo))
+    return terminal
+
+def crear_usuario(usuario, password, rol='pos', terminal=None):
+    """Alta de un usuario con la contraseña hasheada (sin commit)"""
+    usuario = (usuario or '').strip()
+    if not usuario or len(usuario) > 50:
+        raise ValueError('Nombre de usuario inválido')
+    if rol not in ROLES:
+        raise ValueError(f"Rol inválido, debe ser uno de {', '.join(ROLES)}")
+    if not password:
+        raise ValueError('La contraseña no puede estar vacía')
+    if Usuario.query.filter_by(usuario=usuario).first():
+        raise ValueError(f'El usuario {usuario} ya existe')
+
+    if rol == 'admin':
+        terminal = TERMINAL_TODAS
+    elif not Terminal.query.filter_by(codigo=terminal, activa=True).first():
+        raise ValueError(f'Terminal inexistente: {terminal}')
+
+    nuevo = Usuario(usuario=usuario, password_hash=generate_password_hash(password), rol=rol, terminal=terminal)
+    db.session.add(nuevo)
+    return nuevo
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""Los dos backends de carrito: líneas, totales acumulados y cambios concurrentes sobre el mismo carrito"""
+import random
+import sys
+import threading
+
+import pytest
+
+from dinero import a_pesos, subtotal_linea
+
+HILOS = 8
+OPERACIONES_POR_HILO = 30
+
+@pytest.fixture(params=['memoria', 'bd'])
+def modulo(request, nueva_app):
+    return nueva_app(CARRITO_BACKEND=request.param)
+
+@pytest.fixture
+def cliente(modulo):
+    cliente = modulo.app.test_client()
+    cliente.post('/login', data={'usuario': 'pos1', 'password': 'pos1123'})
+    return cliente
+
+def agregar(cliente, producto, cantidad):
+    resp = cliente.post('/agregar-carrito', json={'producto': producto, 'cantidad': cantidad})
+    assert resp.status_code == 200, resp.get_json()
+    return resp.get_json()
+
+def item(producto, cantidad, precio=1.5):
+    return {'producto': producto, 'cantidad': cantidad, 'precio': precio, 'subtotal': a_pesos(subtotal_linea(precio, cantidad))}
+
+def totales_de(lineas):
+    """Lo que deberían valer los acumulados si se sumaran las líneas una por una"""
+    return {
+        'lineas': len(lineas),
+        'unidades': sum(l['cantidad'] for l in lineas),
+        'subtotal_centavos': sum(subtotal_linea(l['precio'], l['cantidad']) for l in lineas)
+    }
+
+def test_agregar_suma_en_la_misma_linea(cliente):
+    primera = agregar(cliente, 'Pezca Gusanos', 2)
+    segunda = agregar(cliente, 'Pezca Gusanos', 1)
+    otra = agregar(cliente, 'Muñeco Coleccionable', 1)
+
+    assert segunda['id'] == primera['id'] != otra['id']
+    assert segunda['linea']['cantidad'] == 3
+    assert segunda['linea']['subtotal'] == 92400.0
+    assert otra['totales']['lineas'] == 2
+    assert otra['totales']['unidades'] == 4
+    assert otra['totales']['subtotal'] == 101300.0
+
+def test_actualizar_y_eliminar_mueven_los_totales(cliente):
+    linea = agregar(cliente, 'Pezca Gusanos', 2)['id']
+    agregar(cliente, 'Muñeco Coleccionable', 1)
+
+    resp = cliente.put(f'/actualizar-carrito/{linea}', json={'cantidad': 5}).get_json()
+    assert resp['linea']['cantidad'] == 5
+    assert resp['totales']['unidades'] == 6
+    assert resp['totales']['subtotal'] == 5 * 30800.0 + 8900.0
+
+    resp = cliente.delete(f'/eliminar-carrito/{linea}').get_json()
+    assert resp['linea'] is None
+    assert resp['totales']['lineas'] == 1
+    assert resp['totales']['subtotal'] == 8900.0
+
+    assert cliente.put(f'/actualizar-carrito/{linea}', json={'cantidad': 1}).status_code == 404
+    assert cliente.delete(f'/eliminar-carrito/{linea}').status_code == 404
+
+def test_quitar_solo_las_lineas_dadas(modulo):
+    carritos = modulo.carritos
+    with modulo.app.app_context():
+        a = carritos.agregar('c1', item('A', 2)).id
+        b = carritos.agregar('c1', item('B', 1)).id
+        totales = carritos.quitar('c1', [a, 999])
+
+        assert [l['id'] for l in carritos.obtener('c1')] == [b]
+        assert totales == carritos.totales('c1') == totales_de(carritos.obtener('c1'))
+
+def test_ids_de_lineas_vaciadas_no_se_repiten(modulo):
+    """El cobro identifica las líneas por id: una línea nueva no puede heredar el de una vendida"""
+    carritos = modulo.carritos
+    with modulo.app.app_context():
+        viejas = {carritos.agregar('c1', item(p, 1)).id for p in ('A', 'B')}
+        carritos.vaciar('c1')
+        nueva = carritos.agregar('c1', item('C', 1)).id
+    assert nueva not in viejas
+
+def test_cobro_tardio_no_vende_lo_agregado_despues(cliente):
+    vendidas = [agregar(cliente, p, 1)['id'] for p in ('Pezca Gusanos', 'Muñeco Coleccionable')]
+    cliente.delete('/limpiar-carrito')
+    nueva = agregar(cliente, 'Juego de Mesa Clásico', 1)['id']
+
+    resp = cliente.post('/finalizar-venta', json={'lineas': vendidas})
+    assert resp.status_code == 400
+
+    resp = cliente.post('/finalizar-venta', json={'lineas': [nueva]})
+    assert resp.status_code == 200
+    assert resp.get_json()['resumen']['totales']['subtotal'] == 15500.0
+    assert cliente.post('/finalizar-venta', json={'lineas': 'todas'}).status_code == 400
+
+def trabajar(modulo, semilla, errores):
+    azar = random.Random(semilla)
+    carritos = modulo.carritos
+    with modulo.app.app_context():
+        for _ in range(OPERACIONES_POR_HILO):
+            try:
+                operacion = azar.random()
+                if operacion < 0.5:
+                    carritos.agregar('c1', item(f'P{azar.randint(1, 3)}', azar.randint(1, 3)))
+                    continue
+                ids = [l['id'] for l in carritos.obtener('c1')]
+                if not ids:
+                    continue
+                if operacion < 0.85:
+                    carritos.actualizar('c1', azar.choice(ids), azar.randint(1, 9))
+                else:
+                    carritos.eliminar('c1', azar.choice(ids))
+            except Exception as e:
+                errores.append(repr(e))
+
+def test_totales_concurrentes_cuadran_con_las_lineas(modulo):
+    errores = []
+    hilos = [threading.Thread(target=trabajar, args=(modulo, i, errores)) for i in range(HILOS)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    with modulo.app.app_context():
+        lineas = modulo.carritos.obtener('c1')
+        totales = modulo.carritos.totales('c1')
+
+    assert not errores, errores[:3]
+    assert totales == totales_de(lineas)
+    assert all(l['subtotal'] == l['cantidad'] * 1.5 for l in lineas)
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""Importes en centavos enteros: redondeo al centavo e IVA calculado una vez sobre el subtotal del ticket"""
+import sys
+from decimal import Decimal
+
+import pytest
+
+from dinero import a_centavos, a_pesos, iva_centavos, subtotal_linea, totales_en_pesos, totales_ticket
+
+@pytest.mark.parametrize('monto, centavos', [
+    (0.1 + 0.2, 30),
+    (1.005, 101),
+    (2.675, 268),
+    ('19.99', 1999),
+    (Decimal('0.015'), 2),
+    (None, 0),
+])
+def test_a_centavos_redondea_al_centavo(monto, centavos):
+    assert a_centavos(monto) == centavos
+
+def test_subtotal_linea_no_acumula_error_de_float():
+    assert subtotal_linea(0.1, 3) == 30
+    assert a_pesos(subtotal_linea(30800.0, 3)) == 92400.0
+    assert a_pesos(None) == 0.0
+
+@pytest.mark.parametrize('subtotal, iva', [
+    (1, 0),       # 0,21 centavos
+    (3, 1),       # 0,63
+    (50, 11),     # 10,5: la mitad redondea hacia arriba
+    (150, 32),    # 31,5
+    (1999, 420),  # 419,79
+])
+def test_iva_redondea_medio_centavo_hacia_arriba(subtotal, iva):
+    assert iva_centavos(subtotal, 21) == iva
+
+def test_iva_sobre_el_ticket_y_no_por_linea():
+    lineas = [subtotal_linea(0.02, 1)] * 5
+    por_linea = sum(iva_centavos(c, 21) for c in lineas)
+    totales = totales_ticket(sum(lineas), 21)
+
+    assert por_linea == 0
+    assert totales['iva_centavos'] == 2
+    assert totales['total_centavos'] == totales['subtotal_centavos'] + totales['iva_centavos'] == 12
+
+def test_totales_en_pesos():
+    assert totales_en_pesos(totales_ticket(1999, 21)) == {
+        'subtotal': 19.99, 'iva': 4.2, 'total': 24.19, 'porcentaje_iva': 21
+    }
+    assert totales_en_pesos(totales_ticket(1000, Decimal('10.5')))['porcentaje_iva'] == 10.5
+    assert totales_ticket(1000, Decimal('10.5'))['iva_centavos'] == 105
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""Un checkout con Idempotency-Key se registra una sola vez por terminal, aunque se reintente"""
+import sys
+
+import pytest
+
+from models import Ticket
+from ventas import claves_recientes
+
+CLAVE = 'checkout-1234567890'
+
+def login(app, usuario):
+    cliente = app.test_client()
+    cliente.post('/login', data={'usuario': usuario, 'password': f'{usuario}123'})
+    return cliente
+
+def cobrar(cliente, clave=CLAVE):
+    return cliente.post('/finalizar-venta', headers={'Idempotency-Key': clave})
+
+@pytest.fixture
+def cliente(aplicacion):
+    cliente = login(aplicacion.app, 'pos1')
+    cliente.post('/agregar-carrito', json={'producto': 'Pezca Gusanos', 'cantidad': 2})
+    return cliente
+
+def tickets(app):
+    with app.app_context():
+        return [(t.id_terminal, t.id_venta) for t in Ticket.query.order_by(Ticket.id)]
+
+def test_reintento_devuelve_el_mismo_resumen(aplicacion, cliente):
+    primero = cobrar(cliente)
+    assert primero.status_code == 200
+    resumen = primero.get_json()['resumen']
+
+    # El carrito quedó vacío: el reintento no se confunde con un checkout nuevo
+    reintento = cobrar(cliente)
+    assert reintento.status_code == 200
+    assert reintento.get_json()['message'] == 'Venta ya registrada'
+    assert reintento.get_json()['resumen'] == resumen
+
+    # Sin la caché en memoria (otro worker, un reinicio) el resumen sale de claves_venta
+    claves_recientes._entradas.clear()
+    assert cobrar(cliente).get_json()['resumen'] == resumen
+    assert len(tickets(aplicacion.app)) == 1
+
+def test_clave_en_curso_devuelve_409(aplicacion, cliente):
+    assert claves_recientes.reservar(('POS1', CLAVE))
+    try:
+        resp = cobrar(cliente)
+    finally:
+        claves_recientes.liberar(('POS1', CLAVE))
+
+    assert resp.status_code == 409
+    assert not tickets(aplicacion.app)
+    # Liberada la reserva, el reintento registra la venta
+    assert cobrar(cliente).status_code == 200
+    assert len(tickets(aplicacion.app)) == 1
+
+def test_la_misma_clave_en_otra_terminal_es_otra_venta(aplicacion, cliente):
+    assert cobrar(cliente).status_code == 200
+
+    otra = login(aplicacion.app, 'pos2')
+    otra.post('/agregar-carrito', json={'producto': 'Muñeco Coleccionable', 'cantidad': 1})
+    resp = cobrar(otra)
+    assert resp.status_code == 200
+    assert resp.get_json()['message'] != 'Venta ya registrada'
+    assert [terminal for terminal, _ in tickets(aplicacion.app)] == ['POS1', 'POS2']
+
+def test_clave_invalida(cliente):
+    assert cobrar(cliente, 'x' * 200).status_code == 400
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""Los planes de las consultas de dashboard, punto_venta y buscar_productos usan los índices compuestos y parciales"""
+import sys
+
+import pytest
+from sqlalchemy import event
+
+from analitica import limpiar_cache
+from catalogo_cache import invalidar_catalogo
+from models import db
+
+# Tablas vigiladas: ninguna consulta de estas rutas puede recorrerlas enteras
+TABLAS = ('tickets', 'resumen_ventas', 'productos')
+
+RUTAS = {
+    '/dashboard': {'ix_tickets_terminal_fecha', 'ix_resumen_terminal_fecha', 'ix_productos_disponibles'},
+    '/punto-venta': {'ix_productos_disponibles'},
+    '/buscar-productos?q=pez': {'ix_productos_disponibles'}
+}
+
+@pytest.fixture
+def cliente(aplicacion):
+    """Base nueva con un ticket vendido y un cliente logueado"""
+    cliente = aplicacion.app.test_client()
+    cliente.post('/login', data={'usuario': 'pos1', 'password': 'pos1123'})
+    for producto in ('Pezca Gusanos', 'Muñeco Coleccionable'):
+        cliente.post('/agregar-carrito', json={'producto': producto, 'cantidad': 2})
+    assert cliente.post('/finalizar-venta').status_code == 200
+    return cliente
+
+def consultas_de(cliente, ruta):
+    """SELECTs que ejecuta la ruta con cachés de catálogo y analítica vacíos"""
+    app = cliente.application
+    with app.app_context():
+        invalidar_catalogo()
+        db.session.commit()
+        motor = db.engine
+    limpiar_cache()
+
+    capturadas = []
+    def capturar(conexion, cursor, sentencia, parametros, contexto, varias):
+        if sentencia.lstrip().upper().startswith('SELECT'):
+            capturadas.append((sentencia, parametros))
+
+    event.listen(motor, 'before_cursor_execute', capturar)
+    try:
+        resp = cliente.get(ruta)
+    finally:
+        event.remove(motor, 'before_cursor_execute', capturar)
+    assert resp.status_code == 200, (ruta, resp.status_code)
+    return capturadas
+
+def plan(app, sentencia, parametros):
+    with app.app_context():
+        with db.engine.connect() as conexion:
+            return [fila[-1] for fila in conexion.exec_driver_sql('EXPLAIN QUERY PLAN ' + sentencia, parametros)]
+
+def revisar_ruta(cliente, ruta):
+    """Índices usados por la ruta; falla si alguna consulta recorre una tabla vigilada sin índice"""
+    usados = set()
+    for sentencia, parametros in consultas_de(cliente, ruta):
+        for paso in plan(cliente.application, sentencia, parametros):
+            palabras = paso.split()
+            if len(palabras) >= 2 and palabras[0] == 'SCAN' and palabras[1] in TABLAS:
+                assert 'USING' in palabras, f'{ruta}: {paso}\n{sentencia}'
+            if 'INDEX' in palabras:
+                usados.add(palabras[palabras.index('INDEX') + 1])
+    faltantes = RUTAS[ruta] - usados
+    assert not faltantes, f'{ruta} no usa {sorted(faltantes)}; usa {sorted(usados)}'
+    return usados
+
+@pytest.mark.parametrize('ruta', list(RUTAS))
+def test_rutas_usan_indices(cliente, ruta):
+    revisar_ruta(cliente, ruta)
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
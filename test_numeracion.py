@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""Prueba de estrés: muchos checkouts concurrentes en la misma terminal sin id_venta duplicados"""
+import sys
+import threading
+from collections import Counter
+
+import pytest
+
+from models import Ticket, Contador
+
+HILOS = 8
+VENTAS_POR_HILO = 25
+
+def vender(app, errores):
+    cliente = app.test_client()
+    cliente.post('/login', data={'usuario': 'pos1', 'password': 'pos1123'})
+    for _ in range(VENTAS_POR_HILO):
+        resp = cliente.post('/agregar-carrito', json={'producto': 'Pezca Gusanos', 'cantidad': 1})
+        if resp.status_code != 200:
+            errores.append(resp.get_json())
+            continue
+        resp = cliente.post('/finalizar-venta')
+        if resp.status_code != 200:
+            errores.append(resp.get_json())
+
+@pytest.mark.parametrize('tamano_bloque', [1, 10])
+def test_checkouts_concurrentes_sin_duplicados(nueva_app, tamano_bloque):
+    modulo = nueva_app(TICKETS_POR_BLOQUE=str(tamano_bloque))
+    assert modulo.asignador_tickets.tamano_bloque == tamano_bloque
+
+    errores = []
+    hilos = [threading.Thread(target=vender, args=(modulo.app, errores)) for _ in range(HILOS)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    with modulo.app.app_context():
+        ids = [t.id_venta for t in Ticket.query.filter_by(id_terminal='POS1').all()]
+        total_ventas = Contador.query.filter_by(terminal='POS1').first().total_ventas
+
+    duplicados = [i for i, n in Counter(ids).items() if n > 1]
+    assert not errores, errores[:3]
+    assert len(ids) == HILOS * VENTAS_POR_HILO, len(ids)
+    assert not duplicados, duplicados[:10]
+    assert total_ventas == HILOS * VENTAS_POR_HILO, total_ventas
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
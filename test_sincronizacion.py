@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""/sincronizar-ventas: los tickets hechos sin conexión se registran una vez y con el precio del catálogo"""
+import sys
+
+import pytest
+
+from models import Ticket, LineaVenta
+
+@pytest.fixture
+def cliente(aplicacion):
+    cliente = aplicacion.app.test_client()
+    cliente.post('/login', data={'usuario': 'pos1', 'password': 'pos1123'})
+    return cliente
+
+def ticket(clave, *items):
+    return {'clave': clave, 'fecha': '2026-10-17', 'hora': '10:30:00', 'items': [
+        {'producto': producto, 'cantidad': cantidad, 'precio': 1} for producto, cantidad in items
+    ]}
+
+def sincronizar(cliente, *tickets):
+    resp = cliente.post('/sincronizar-ventas', json={'tickets': list(tickets)})
+    assert resp.status_code == 200, resp.get_json()
+    return resp.get_json()['resultados']
+
+def test_lote_con_registrados_duplicados_y_rechazados(aplicacion, cliente):
+    resultados = sincronizar(
+        cliente,
+        ticket('offline-0001', ('Pezca Gusanos', 2)),
+        ticket('offline-0002', ('pezca gusanos', 1), ('Muñeco Coleccionable', 1)),
+        ticket('offline-0001', ('Pezca Gusanos', 2)),
+        ticket('offline-0003', ('No Existe', 1)),
+        {'clave': 'offline-0004', 'items': []}
+    )
+
+    assert [r['estado'] for r in resultados] == ['registrado', 'registrado', 'duplicado', 'rechazado', 'rechazado']
+    assert resultados[2]['resumen'] == resultados[0]['resumen']
+    assert 'No Existe' in resultados[3]['message']
+
+    # El precio mandado por la terminal se ignora: vale el del catálogo
+    assert resultados[0]['resumen']['totales']['subtotal'] == 61600.0
+    assert resultados[1]['resumen']['totales']['subtotal'] == 30800.0 + 8900.0
+
+    with aplicacion.app.app_context():
+        ids = sorted(t.id_venta for t in Ticket.query.filter_by(id_terminal='POS1'))
+        nombres = {l.producto_nombre for l in LineaVenta.query}
+    assert len(ids) == 2 and ids[1] == ids[0] + 1
+    assert nombres == {'Pezca Gusanos', 'Muñeco Coleccionable'}
+
+def test_reenviar_el_lote_no_duplica_ventas(aplicacion, cliente):
+    lote = [ticket('offline-0001', ('Pezca Gusanos', 1)), ticket('offline-0002', ('Muñeco Coleccionable', 3))]
+    primera = sincronizar(cliente, *lote)
+    segunda = sincronizar(cliente, *lote)
+
+    assert [r['estado'] for r in segunda] == ['duplicado', 'duplicado']
+    assert [r['resumen'] for r in segunda] == [r['resumen'] for r in primera]
+    with aplicacion.app.app_context():
+        assert Ticket.query.count() == 2
+
+def test_lote_invalido(cliente):
+    assert cliente.post('/sincronizar-ventas', json={}).status_code == 400
+    assert cliente.post('/sincronizar-ventas', json={'tickets': []}).status_code == 400
+
+if __name__ == '__main__':
+    sys.exit(pytest.main([__file__, '-q']))
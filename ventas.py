@@ -0,0 +1,339 @@
+from collections import OrderedDict
+from datetime import date, datetime, time
+import json
+import logging
+import os
+import threading
+from time import monotonic
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
+
+from dinero import PORCENTAJE_IVA, a_centavos, a_pesos, subtotal_linea, totales_en_pesos, totales_ticket
+from models import db, Producto, Ticket, LineaVenta, Contador, ClaveVenta, normalizar_nombre
+from resumenes import registrar_venta
+
+logger = logging.getLogger(__name__)
+
+LARGO_MAXIMO_CLAVE = 64
+MAXIMO_TICKETS_POR_LOTE = 200
+
+class ClavesRecientes:
+    """LRU con vencimiento de los resúmenes de checkout por clave de idempotencia.
+
+    Un reintento con una clave conocida se contesta desde memoria sin tocar la BD;
+    la tabla claves_venta sigue siendo la fuente durable entre workers. `reservar`
+    marca la clave como en curso para que un doble clic no registre dos tickets.
+    Las entradas van por (terminal, clave): una terminal no ve las claves de otra.
+    """
+
+    def __init__(self, capacidad=5000, ttl=6 * 3600):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._en_curso = set()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] <= monotonic():
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada[1]
+
+    def guardar(self, clave, resumen):
+        with self._lock:
+            self._entradas[clave] = (monotonic() + self.ttl, resumen)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def reservar(self, clave):
+        with self._lock:
+            if clave in self._en_curso:
+                return False
+            self._en_curso.add(clave)
+            return True
+
+    def liberar(self, clave):
+        with self._lock:
+            self._en_curso.discard(clave)
+
+claves_recientes = ClavesRecientes(
+    capacidad=int(os.getenv('IDEMPOTENCIA_CAPACIDAD', '5000')),
+    ttl=int(os.getenv('IDEMPOTENCIA_TTL', str(6 * 3600)))
+)
+
+def texto_cliente(terminal_id, numero_cliente):
+    return f"CLIENTE-{terminal_id}-{numero_cliente:04d}"
+
+def totales_de(items, porcentaje_iva=PORCENTAJE_IVA):
+    """Totales en centavos del ticket: suma exacta de las líneas y el IVA calculado una vez"""
+    return totales_ticket(sum(subtotal_linea(i['precio'], i['cantidad']) for i in items), porcentaje_iva)
+
+def ids_por_nombre(ejecutor, nombres):
+    """{nombre: id de producto} con la misma búsqueda sin mayúsculas que Producto.buscar_por_nombre"""
+    normalizados = {n: normalizar_nombre(n) for n in nombres}
+    ids = dict(ejecutor.execute(
+        db.select(Producto.nombre_normalizado, Producto.id).where(Producto.nombre_normalizado.in_(set(normalizados.values())))
+    ).all())
+    return {n: ids[clave] for n, clave in normalizados.items() if clave in ids}
+
+def vincular_productos(conexion, lote=1000):
+    """Completa producto_id en las líneas que solo tienen el nombre; devuelve cuántas vinculó.
+
+    Recorre las líneas por id, de a `lote`. Las de productos que no están en el
+    catálogo quedan en NULL y se pueden volver a intentar después de darlos de alta.
+    """
+    conocidos = {}
+    vinculadas, ultimo = 0, 0
+    while True:
+        filas = conexion.execute(
+            db.select(LineaVenta.id, LineaVenta.producto_nombre)
+            .where(LineaVenta.producto_id.is_(None), LineaVenta.id > ultimo)
+            .order_by(LineaVenta.id).limit(lote)
+        ).all()
+        if not filas:
+            return vinculadas
+        ultimo = filas[-1].id
+
+        nuevos = {f.producto_nombre for f in filas} - conocidos.keys()
+        if nuevos:
+            conocidos.update(dict.fromkeys(nuevos))
+            conocidos.update(ids_por_nombre(conexion, nuevos))
+        cambios = [{'linea': f.id, 'producto': conocidos[f.producto_nombre]} for f in filas if conocidos[f.producto_nombre]]
+        if cambios:
+            conexion.execute(
+                db.update(LineaVenta.__table__)
+                .where(LineaVenta.__table__.c.id == bindparam('linea'))
+                .values(producto_id=bindparam('producto')),
+                cambios
+            )
+            vinculadas += len(cambios)
+
+def resumen_ticket(totales, cantidad_items, id_venta, id_cliente, fecha, hora):
+    """El resumen que devuelve el checkout y que se guarda para las claves de idempotencia"""
+    visibles = totales_en_pesos(totales)
+    return {
+        'id_venta': id_venta,
+        'id_cliente': id_cliente,
+        'total_productos': cantidad_items,
+        'totales': {
+            'subtotal': visibles['subtotal'],
+            'iva': visibles['iva'],
+            'total': visibles['total']
+        },
+        'fecha': str(fecha),
+        'hora': str(hora)
+    }
+
+def guardar_tickets(terminal_id, tickets):
+    """Inserta cabecera y líneas de varios tickets ya numerados y actualiza resúmenes y contador (sin commit).
+
+    Cada ticket es un dict con items, id_venta, numero_cliente, fecha, hora y
+    opcionalmente clave. Devuelve los resúmenes en el mismo orden.
+    """
+    cabeceras, claves, resumenes = [], [], []
+    for ticket in tickets:
+        id_cliente = texto_cliente(terminal_id, ticket['numero_cliente'])
+        items = ticket['items']
+        totales = totales_de(items)
+        cabeceras.append({
+            'id_terminal': terminal_id,
+            'id_venta': ticket['id_venta'],
+            'fecha': ticket['fecha'],
+            'hora': ticket['hora'],
+            'id_cliente': id_cliente,
+            'vendedor': f'POS {terminal_id}',
+            **totales,
+            'porcentaje_iva': float(totales['porcentaje_iva'])
+        })
+
+        registrar_venta(
+            ticket['fecha'],
+            terminal_id,
+            lineas=len(items),
+            unidades=sum(i['cantidad'] for i in items),
+            ingresos_centavos=totales['subtotal_centavos']
+        )
+
+        resumen = resumen_ticket(totales, len(items), ticket['id_venta'], id_cliente, ticket['fecha'], ticket['hora'])
+        resumenes.append(resumen)
+        if ticket.get('clave'):
+            claves.append({
+                'clave': ticket['clave'],
+                'id_terminal': terminal_id,
+                'id_venta': ticket['id_venta'],
+                'resumen': json.dumps(resumen)
+            })
+
+    # Un solo INSERT multi-fila para las cabeceras (devuelve sus ids) y otro para todas las líneas
+    ids_ticket = dict(db.session.execute(db.insert(Ticket).returning(Ticket.id_venta, Ticket.id), cabeceras).all())
+    ids_producto = ids_por_nombre(db.session, {item['producto'] for ticket in tickets for item in ticket['items']})
+    db.session.execute(db.insert(LineaVenta), [
+        {
+            'ticket_id': ids_ticket[ticket['id_venta']],
+            'producto_id': ids_producto.get(item['producto']),
+            'producto_nombre': item['producto'],
+            'cantidad': item['cantidad'],
+            'precio_centavos': a_centavos(item['precio'])
+        }
+        for ticket in tickets for item in ticket['items']
+    ])
+    if claves:
+        db.session.execute(db.insert(ClaveVenta), claves)
+
+    Contador.query.filter_by(terminal=terminal_id).update(
+        {Contador.total_ventas: Contador.total_ventas + len(tickets)},
+        synchronize_session=False
+    )
+    return resumenes
+
+def resumenes_guardados(terminal_id, claves):
+    """Resúmenes ya registrados por la terminal para las claves de idempotencia dadas, primero desde memoria"""
+    guardados = {}
+    faltantes = []
+    for clave in claves:
+        resumen = claves_recientes.obtener((terminal_id, clave))
+        if resumen is None:
+            faltantes.append(clave)
+        else:
+            guardados[clave] = resumen
+
+    if faltantes:
+        filas = db.session.query(ClaveVenta.clave, ClaveVenta.resumen).filter(
+            ClaveVenta.id_terminal == terminal_id,
+            ClaveVenta.clave.in_(faltantes)
+        ).all()
+        for clave, resumen in filas:
+            guardados[clave] = json.loads(resumen)
+            claves_recientes.guardar((terminal_id, clave), guardados[clave])
+    return guardados
+
+def validar_clave(clave):
+    if not isinstance(clave, str) or not clave.strip() or len(clave.strip()) > LARGO_MAXIMO_CLAVE:
+        raise ValueError(f'Clave de idempotencia inválida (hasta {LARGO_MAXIMO_CLAVE} caracteres)')
+    return clave.strip()
+
+def _validar_ticket(ticket):
+    if not isinstance(ticket, dict):
+        raise ValueError('Ticket inválido')
+    clave = validar_clave(ticket.get('clave'))
+
+    # El precio que manda la terminal se ignora: se toma del catálogo al registrar
+    items = []
+    for item in ticket.get('items') or []:
+        producto = str(item.get('producto') or '').strip()
+        cantidad = int(item.get('cantidad') or 0)
+        if not producto or cantidad <= 0:
+            raise ValueError(f'Item inválido: {producto or "sin nombre"}')
+        items.append({'producto': producto, 'cantidad': cantidad})
+    if not items:
+        raise ValueError('El ticket no tiene items')
+
+    fecha = date.fromisoformat(ticket['fecha']) if ticket.get('fecha') else date.today()
+    hora = time.fromisoformat(ticket['hora']) if ticket.get('hora') else datetime.now().time()
+    return {'clave': clave, 'items': items, 'fecha': fecha, 'hora': hora}
+
+def productos_disponibles(nombres):
+    """{nombre: Producto} de los disponibles, con la búsqueda sin mayúsculas de Producto.buscar_por_nombre"""
+    normalizados = {n: normalizar_nombre(n) for n in nombres}
+    productos = {
+        p.nombre_normalizado: p for p in Producto.query.filter(
+            Producto.nombre_normalizado.in_(set(normalizados.values())),
+            Producto.estado == 'Disponible'
+        )
+    }
+    return {n: productos[clave] for n, clave in normalizados.items() if clave in productos}
+
+def _precios_de_catalogo(ticket, productos):
+    """Nombre y precio de cada item según el catálogo; ValueError si alguno no está disponible"""
+    for item in ticket['items']:
+        producto = productos.get(item['producto'])
+        if producto is None:
+            raise ValueError(f"Producto no disponible en el catálogo: {item['producto']}")
+        item.update(
+            producto=producto.nombre,
+            precio=producto.precio_venta,
+            subtotal=a_pesos(subtotal_linea(producto.precio_venta, item['cantidad']))
+        )
+
+def sincronizar_tickets(terminal_id, tickets, asignador):
+    """Registra un lote de tickets hechos sin conexión, una sola vez por clave.
+
+    Los `id_venta` se asignan al recibir el lote, con una única reserva atómica
+    sobre el contador de la terminal. Los items se valoran con el precio del
+    catálogo y un ticket con productos no disponibles se rechaza entero.
+    Devuelve un resultado por ticket, en orden.
+    """
+    for intento in range(2):
+        resultados, nuevos = [], []
+        validos = {}
+        for ticket in tickets:
+            try:
+                valido = _validar_ticket(ticket)
+            except (ValueError, TypeError, AttributeError) as e:
+                clave = ticket.get('clave') if isinstance(ticket, dict) else None
+                resultados.append({'clave': clave, 'estado': 'rechazado', 'message': str(e)})
+                continue
+            resultados.append({'clave': valido['clave']})
+            if valido['clave'] not in validos:
+                validos[valido['clave']] = valido
+
+        existentes = resumenes_guardados(terminal_id, list(validos))
+        nuevos = [t for clave, t in validos.items() if clave not in existentes]
+
+        productos = productos_disponibles({i['producto'] for t in nuevos for i in t['items']})
+        rechazados = {}
+        for ticket in nuevos:
+            try:
+                _precios_de_catalogo(ticket, productos)
+            except ValueError as e:
+                rechazados[ticket['clave']] = str(e)
+        if rechazados:
+            nuevos = [t for t in nuevos if t['clave'] not in rechazados]
+            for resultado in resultados:
+                if resultado['clave'] in rechazados and 'estado' not in resultado:
+                    resultado.update(estado='rechazado', message=rechazados[resultado['clave']])
+
+        try:
+            if nuevos:
+                numeraciones = asignador.reservar(terminal_id, len(nuevos))
+                if numeraciones is None:
+                    raise LookupError(f'Terminal no configurada: {terminal_id}')
+                for ticket, (id_venta, numero_cliente) in zip(nuevos, numeraciones):
+                    ticket['id_venta'] = id_venta
+                    ticket['numero_cliente'] = numero_cliente
+                registrados = dict(zip((t['clave'] for t in nuevos), guardar_tickets(terminal_id, nuevos)))
+                db.session.commit()
+                for clave, resumen in registrados.items():
+                    claves_recientes.guardar((terminal_id, clave), resumen)
+            else:
+                registrados = {}
+            break
+        except IntegrityError:
+            # Otro request registró alguna de estas claves al mismo tiempo: se reintenta
+            # una vez y esas claves aparecen como duplicadas
+            db.session.rollback()
+            if intento:
+                raise
+            logger.warning(f"⚠️ Claves de venta registradas en paralelo, reintentando lote de {terminal_id}")
+
+    informadas = set()
+    for resultado in resultados:
+        clave = resultado['clave']
+        if 'estado' in resultado:
+            continue
+        if clave in registrados and clave not in informadas:
+            resultado.update(estado='registrado', resumen=registrados[clave])
+        else:
+            resultado.update(estado='duplicado', resumen=existentes.get(clave) or registrados[clave])
+        informadas.add(clave)
+
+    if nuevos:
+        logger.info(f"🔄 {len(nuevos)} ventas sincronizadas de {terminal_id} ({len(tickets) - len(nuevos)} repetidas o rechazadas)")
+    return resultados